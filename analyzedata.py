@@ -1,84 +1,63 @@
-import os
-from properties import dbpath
+from properties import dbpath, analysisworkers
 from libs.dbmanager import DBManager
-from libs.codeanalysis import extract_features
-from libs.codequality import block_quality_violations
+from libs.analysis import analyze_link, analyze_links_parallel, collect_javascript_blocks
+from libs.codequality import prefetch_block_violations
+from libs.scratch import scratch_space
+from libs.resultcache import result_cache
 
 """ Data Analysis:
  - Features extraction (Code clones, before-after quality violations, ...)
  - Generated blocks quality violations
 """
 
-# Connect to database
-dbmanager = DBManager(dbpath)
-
-# Create a directory for temporary files
-temp_dir = "./temp_files"
-os.makedirs(temp_dir, exist_ok=True) 
-
-print("\nAnalyzing data")
-
-print("Extracting commit features")
-# Get all chatgpt links that relate to commits
-for l, link in enumerate(dbmanager.db['links'].find({'MentionedSource': 'commit'}, {'_id': False})):
-
-	# Get the commit
-	commit = dbmanager.db['commits'].find_one({'URL': link['MentionedURL']})
-
-	# Call function to extract the features of the commit
-	features = extract_features(commit, temp_dir)
-	# Add commits's feature set to database
-	sharing = commit['ChatgptSharing'][0]
-	sharing['AnalysisFeatures'] = features
-	query = {'$set': {f'ChatgptSharing.{0}': sharing}}
-	# Add file's link with scenario category to database
-	dbmanager.update('commits', {'_id': commit['_id']}, query)
-
-	# Add attribute to commit variable also
-	commit['ChatgptSharing'][0]['AnalysisFeatures'] = features
-
-	# Call function to calculate the quality violatations for every generated code block in the shared link
-	commitsharing = block_quality_violations(commit)
-
-	# If quality analysis finished sucessfully, update db
-	if commitsharing != -1:
-		query = {'$set': {f'ChatgptSharing.{0}': commitsharing}}
-		# Add file's link with scenario category to database
-		dbmanager.update('commits', {'_id': commit['_id']}, query)
-
-print("Extracting file features")
-# Get all chatgpt links that relate to code files
-for l, link in enumerate(dbmanager.db['links'].find({'MentionedSource': 'code file'}, {'_id': False})):
-	# Get the code file
-	file = dbmanager.db['files'].find_one({'URL': link['MentionedURL']})
-
-	# Retrieve the information of the specific ChatGpt sharing ( Each file can have multiple sharings )
-	sharedlink = link['URL']
-	for i, sharing in enumerate(file.get('ChatgptSharing', '')):
-		if sharing['URL'] == sharedlink:
-			currentsharing = sharing
-			sharingidx = i
-			break
-
-	# Extract sharing-specific features and save them to db
-	sharingfeatures = extract_features(file, temp_dir, sharingidx)
-	currentsharing['AnalysisFeatures'] = sharingfeatures
-
-	# Add attribute to local variable
-	file['ChatgptSharing'][i] = currentsharing
-
-	# Call function to calculate the quality violatations for every generated code block in the shared link
-	result = block_quality_violations(file, i)
-	# If quality finished sucessfully
-	if result != -1:
-		currentsharing = result
-
-	# Update the ChatgptSharing to db with the features extracted from the code and quality analysis
-	query = {'$set': {f'ChatgptSharing.{i}': currentsharing}}
-	dbmanager.update('files', {'_id': file['_id']}, query)
-
-# Remove the directory with temporary files
-os.rmdir(temp_dir)
-
-# Close the DB connection
-dbmanager.close()
+if __name__ == "__main__":
+	# Connect to database
+	dbmanager = DBManager(dbpath)
+
+	# Number of worker processes used to analyze the links concurrently
+	workers = int(analysisworkers) if analysisworkers else 1
+
+	def analyze_links(collection_name, links):
+		if workers > 1:
+			return analyze_links_parallel(dbpath, links, workers)
+
+		# Run PMD for the generated code blocks of all the links at once (a few JVM launches instead of one per sharing).
+		# The violations are kept only for the pass over the collection's links
+		block_violations = {}
+		if prefetch_block_violations(collect_javascript_blocks(dbmanager, collection_name, links), block_violations) == -1:
+			print('Error in generated-code quality analysis of some code blocks, their sharings are stored without the violations')
+		return (analyze_link(dbmanager, link, block_violations) for link in links)
+
+	print("\nAnalyzing data")
+
+	print("Extracting commit features")
+	# Get all chatgpt links that relate to commits
+	links = list(dbmanager.db['links'].find({'MentionedSource': 'commit'}, {'_id': False}))
+	with dbmanager.bulk_writer('commits', batch_size=100) as writer:
+		for filter, query in analyze_links('commits', links):
+			writer.update(filter, query)
+
+	print(f"Updated {writer.counts['Modified']} commits")
+
+	print("Extracting file features")
+	# Get all chatgpt links that relate to code files
+	links = list(dbmanager.db['links'].find({'MentionedSource': 'code file'}, {'_id': False}))
+	with dbmanager.bulk_writer('files', batch_size=100) as writer:
+		for filter, query in analyze_links('files', links):
+			writer.update(filter, query)
+
+	print(f"Updated {writer.counts['Modified']} sharings of files")
+
+	# Remove the temporary files given to the tools (each worker process removes its own)
+	if workers == 1:
+		print(scratch_space.report())
+	scratch_space.close()
+
+	# Report the usage of the analysis result cache (each worker process reports its own)
+	if result_cache:
+		if workers == 1:
+			print(f"Analysis result cache: {result_cache.counts}")
+		result_cache.close()
+
+	# Close the DB connection
+	dbmanager.close()
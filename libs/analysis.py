@@ -0,0 +1,162 @@
+from multiprocessing.util import Finalize
+from concurrent.futures import ProcessPoolExecutor
+from libs.dbmanager import DBManager
+from libs.codeanalysis import extract_features
+from libs.codequality import block_quality_violations
+from libs.scratch import scratch_space
+from libs.resultcache import result_cache
+
+# Database connection of an analysis worker process (created once per process)
+_worker_dbmanager = None
+
+
+def analyze_commit_link(dbmanager, link, block_violations=None):
+	"""
+	This function analyzes the commit that a shared link refers to: it extracts the features of the commit
+	and calculates the quality violations of the generated code blocks of the sharing.
+
+	:param dbmanager: The DBManager object used to retrieve the commit
+	:param link: A dictionary containing the information of the shared link
+	:param block_violations: An optional dictionary of the PMD violations of the code blocks already analyzed (see `block_quality_violations`)
+	:returns: A tuple containing the filter and the update query that store the analysis results to the commit.
+	"""
+
+	# Get the commit
+	commit = dbmanager.db['commits'].find_one({'URL': link['MentionedURL']})
+
+	# Call function to extract the features of the commit
+	features = extract_features(commit)
+	# Add commits's feature set to the sharing
+	sharing = commit['ChatgptSharing'][0]
+	sharing['AnalysisFeatures'] = features
+
+	# Add attribute to commit variable also
+	commit['ChatgptSharing'][0]['AnalysisFeatures'] = features
+
+	# Call function to calculate the quality violatations for every generated code block in the shared link
+	commitsharing = block_quality_violations(commit, block_violations=block_violations)
+
+	# If quality analysis finished sucessfully, store the updated sharing (it already contains the features)
+	if commitsharing != -1:
+		sharing = commitsharing
+
+	# Add commit's sharing with the analysis results to database
+	query = {'$set': {f'ChatgptSharing.{0}': sharing}}
+	return {'_id': commit['_id']}, query
+
+
+def analyze_file_link(dbmanager, link, block_violations=None):
+	"""
+	This function analyzes the code file that a shared link refers to: it extracts the features of the file
+	for the specific sharing and calculates the quality violations of the generated code blocks of the sharing.
+
+	:param dbmanager: The DBManager object used to retrieve the code file
+	:param link: A dictionary containing the information of the shared link
+	:param block_violations: An optional dictionary of the PMD violations of the code blocks already analyzed (see `block_quality_violations`)
+	:returns: A tuple containing the filter and the update query that store the analysis results to the file's sharing.
+	"""
+
+	# Get the code file
+	file = dbmanager.db['files'].find_one({'URL': link['MentionedURL']})
+
+	# Retrieve the information of the specific ChatGpt sharing ( Each file can have multiple sharings )
+	sharedlink = link['URL']
+	for i, sharing in enumerate(file.get('ChatgptSharing', '')):
+		if sharing['URL'] == sharedlink:
+			currentsharing = sharing
+			sharingidx = i
+			break
+
+	# Extract sharing-specific features and save them to db
+	sharingfeatures = extract_features(file, sharingidx=sharingidx)
+	currentsharing['AnalysisFeatures'] = sharingfeatures
+
+	# Add attribute to local variable
+	file['ChatgptSharing'][sharingidx] = currentsharing
+
+	# Call function to calculate the quality violatations for every generated code block in the shared link
+	result = block_quality_violations(file, sharingidx, block_violations)
+	# If quality finished sucessfully
+	if result != -1:
+		currentsharing = result
+
+	# Update the ChatgptSharing to db with the features extracted from the code and quality analysis
+	query = {'$set': {f'ChatgptSharing.{sharingidx}': currentsharing}}
+	return {'_id': file['_id']}, query
+
+
+def analyze_link(dbmanager, link, block_violations=None):
+	"""
+	Analyzes the source (commit or code file) that a shared link refers to.
+	"""
+
+	if link['MentionedSource'] == 'commit':
+		return analyze_commit_link(dbmanager, link, block_violations)
+	return analyze_file_link(dbmanager, link, block_violations)
+
+
+def collect_javascript_blocks(dbmanager, collection_name, links):
+	"""
+	This function retrieves the generated JavaScript code blocks of the sources (commits or files) that the links refer to,
+	so that their PMD violations can be calculated in a few batches before the analysis.
+
+	:param dbmanager: The DBManager object used to retrieve the sources
+	:param collection_name: A string containing the name of the collection of the sources
+	:param links: A list of dictionaries containing the information of the shared links
+	:returns: A list of strings containing the code blocks.
+	"""
+
+	urls = [link['MentionedURL'] for link in links]
+	projection = {'ChatgptSharing.Conversations.ListOfCode.Type': True, 'ChatgptSharing.Conversations.ListOfCode.Content': True}
+
+	blocks = []
+	for source in dbmanager.db[collection_name].find({'URL': {'$in': urls}}, projection):
+		for sharing in source.get('ChatgptSharing', []):
+			for conversation in sharing.get('Conversations', []):
+				for code in conversation.get('ListOfCode', []):
+					if code.get('Type') == 'javascript':
+						blocks.append(code['Content'])
+	return blocks
+
+
+def _init_worker(dbpath):
+	"""
+	Initializer of the analysis worker processes. Each worker opens its own MongoClient connection and
+	writes the files given to the tools in its own scratch space, so that they do not collide.
+	"""
+
+	global _worker_dbmanager
+	_worker_dbmanager = DBManager(dbpath)
+	# Worker processes do not run the atexit handlers, so remove the scratch space when the pool shuts down
+	Finalize(scratch_space, _close_worker, exitpriority=10)
+
+
+def _close_worker():
+	print(f"Analysis worker: {scratch_space.report()}")
+	scratch_space.close()
+	if result_cache:
+		print(f"Analysis worker: result cache {result_cache.counts}")
+		result_cache.close()
+
+
+def _analyze_link_worker(link):
+	"""
+	Analyzes a link using the database connection and the scratch space of the current worker process.
+	"""
+
+	return analyze_link(_worker_dbmanager, link)
+
+
+def analyze_links_parallel(dbpath, links, max_workers):
+	"""
+	Analyzes several links concurrently, using a pool of worker processes. The links are independent,
+	so each one is analyzed by a single worker, which runs the external tools (Simian and PMD) of the link.
+
+	:param dbpath: A string that represents the connection string of the MongoDB database
+	:param links: A list of dictionaries containing the information of the shared links
+	:param max_workers: An integer specifying the maximum number of worker processes
+	:returns: A generator of the (filter, update query) tuples of the links, in the same order as `links`.
+	"""
+
+	with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(dbpath,)) as executor:
+		yield from executor.map(_analyze_link_worker, links)
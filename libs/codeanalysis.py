@@ -1,16 +1,140 @@
 import subprocess
+import atexit
 import base64
 import re
 import os
-from properties import java, simian
-from libs.utils import get_content_from_patch, get_file_extension
-from libs.codequality import before_after_violations
+import functools
+from contextlib import nullcontext
+from properties import java, simian, simianworker
+from libs.utils import get_file_extension
+from libs.patch import parse_patch
+from libs.codequality import before_after_violations_many
+from libs.scratch import ScratchSpace, scratch_space
+from libs.resultcache import result_cache
+from libs.fingerprint import file_fingerprint, tool_fingerprint
 
 
-def detect_code_clone(code_file, chatgpt_code_blocks, file_extension, min_lines, temp_dir):
+# Path of the source of the long-lived Simian worker
+SIMIAN_WORKER_SOURCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'simianworker', 'SimianWorker.java')
+SIMIAN_WORKER_END = '@@SIMIAN-END@@ '
+
+# Base and modulus of the rolling hash used by the native clone detection engine
+HASH_BASE = 1000003
+HASH_MOD = (1 << 61) - 1
+
+
+class SimianWorker:
+	"""
+	Class for running Simian in a long-lived JVM (see `simianworker/SimianWorker.java`), so that the JVM is
+	started once instead of once per comparison. Requests (Simian's arguments) are sent over stdin, one per line, 
+	and the worker answers with Simian's output followed by an end marker line containing the exit code.
+	"""
+
+	def __init__(self):
+		self.process = None
+		self.failed = False
+
+	def start(self):
+		java_path = java.strip('"') if java else 'java'
+		command = [java_path, '-Djava.security.manager=allow', '-cp', simian, SIMIAN_WORKER_SOURCE, simian]
+		self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+										text=True, encoding='utf-8', errors='replace')
+
+	def run(self, args):
+		"""
+		Runs Simian with the given arguments in the worker.
+		
+		:param args: A list of strings containing the command line arguments of Simian
+		:returns: A tuple containing Simian's exit code and output. If the worker is not available, it returns None.
+		"""
+
+		if self.failed:
+			return None
+
+		try:
+			if self.process is None or self.process.poll() is not None:
+				self.start()
+
+			self.process.stdin.write('\t'.join(args) + '\n')
+			self.process.stdin.flush()
+
+			output_lines = []
+			for line in self.process.stdout:
+				if line.startswith(SIMIAN_WORKER_END):
+					return int(line[len(SIMIAN_WORKER_END):]), ''.join(output_lines)
+				output_lines.append(line)
+		except (OSError, ValueError, TypeError):
+			pass
+
+		# The worker could not be started or terminated unexpectedly, so stop using it
+		print("Simian worker not available, running Simian once per comparison.")
+		self.failed = True
+		self.close()
+		return None
+
+	def close(self):
+		if self.process is not None:
+			try:
+				self.process.stdin.close()
+				self.process.wait(timeout=10)
+			except (OSError, ValueError, subprocess.TimeoutExpired):
+				self.process.kill()
+			self.process = None
+
+
+# Simian worker of the process (started on first use)
+simian_worker = SimianWorker()
+atexit.register(simian_worker.close)
+
+
+def run_simian(args, use_worker=None):
+	"""
+	Runs Simian with the given arguments, using the long-lived worker (unless it is disabled or not available),
+	or a separate JVM otherwise.
+	
+	:param args: A list of strings containing the command line arguments of Simian
+	:param use_worker: An (optional) boolean specifying whether the long-lived worker is used. Defaults to the SIMIANWORKER environment variable.
+	:returns: A tuple containing Simian's exit code and output (as string). The exit code is derived from the summary
+	of the output (0: no duplicates found, 1: duplicates found), or it is 2 if Simian finished with error.
+	"""
+
+	if use_worker is None:
+		use_worker = simianworker != '0'
+
+	result = simian_worker.run(args) if use_worker else None
+	if result is None:
+		# Define the Simian command
+		cpd_command = f'"{java}" -jar "{simian}" ' + ' '.join(args)
+
+		# Run the command and capture the output
+		output = subprocess.run(cpd_command, shell=True, text=False, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+		result = output.returncode, output.stdout.decode('utf-8')
+
+	returncode, output = result
+	return simian_status(returncode, output), output
+
+
+def simian_status(returncode, output):
+	"""
+	Returns the exit code of a Simian run from its output, instead of relying on the exit code alone
+	(e.g. the exit code trapped by the worker is 0 if Simian returns without calling System.exit).
+	
+	:param returncode: An integer containing the exit code of Simian
+	:param output: A string containing Simian's output
+	:returns: 0 if no duplicates were found, 1 if duplicates were found, and 2 if Simian finished with error 
+	(or its output has no summary).
+	"""
+
+	summary = re.findall(r'Found (\d+) duplicate lines in \d+ blocks in \d+ files', output)
+	if returncode == 2 or not summary:
+		return 2
+	return 1 if int(summary[-1]) > 0 else 0
+
+
+def detect_code_clone(code_file, chatgpt_code_blocks, file_extension, min_lines, temp_dir=None, engine='simian', line_numbers=None):
 	"""
 	This function detects code clones between a given code file and a list of code
-	blocks using the Simian tool, and returns information about the code clones if any are found.
+	blocks using the Simian tool (or the native Python engine), and returns information about the code clones if any are found.
 	
 	:param code_file: A string containing the content of the code file that you want to check
 	:param chatgpt_code_blocks: A list of code blocks extracted from a Chatgpt conversation. These code
@@ -18,8 +142,13 @@ def detect_code_clone(code_file, chatgpt_code_blocks, file_extension, min_lines,
 	:param file_extension: A string that represents the file extension of the code file.
 	:param min_lines: An integer specifying the minimum number of lines that a code clone must
 	have in order to be considered a match
-	:param temp_dir: A string that specifies the directory where temporary files will be stored. 
-	These temporary files are used to compare the code blocks and detect code clones
+	:param temp_dir: An (optional) string that specifies the directory where temporary files will be stored. 
+	These temporary files are used to compare the code blocks and detect code clones. Defaults to the scratch space of the process.
+	:param engine: An (optional) string specifying the clone detection engine, 'simian' (default) or 'python'. 
+	The parity of the native Python engine with Simian is not verified yet (see `test/testclonedetector.py`), 
+	so it is not used by the analysis.
+	:param line_numbers: An (optional) list containing the line number in the real file of each line of `code_file`
+	(e.g. when the code file is reconstructed from a patch). It is used for the lines reported in CloneDetails.
 	:returns: A dictionary that contains information about the best detected code clone found. 
 	The dictionary includes the following keys: (If at least one code clone found. Else the dictionary is empty)
 		- DuplicateLines: An integer specifying the number of lines that were cloned
@@ -28,79 +157,238 @@ def detect_code_clone(code_file, chatgpt_code_blocks, file_extension, min_lines,
 		- CloneDetails: A string representing the exact lines of the code file that were cloned. 
 	"""
 
+	# Serve the result from the result cache, if the same comparison was made before
+	cache_key = None
+	if result_cache:
+		cache_key = result_cache.key('clone-sharing', engine, clone_engine_fingerprint(engine), min_lines, file_extension, code_file, chatgpt_code_blocks, line_numbers)
+		cached = result_cache.get(cache_key)
+		if cached is not None:
+			return cached
+
 	# Initialize variable
 	code_clone = {}
 
-	# Create temporary files
-	file_path1 = os.path.join(temp_dir, f"./file_code{file_extension}")
-	with open(file_path1, 'w', encoding='cp437', errors="ignore") as file1:
-		file1.write(code_file)
+	# Keep only the characters that Simian sees in the temporary files
+	file_content = code_file.encode('cp437', errors='ignore').decode('cp437')
 
-	file_path2 = os.path.join(temp_dir, f"./chat_code{file_extension}")
+	# Use a scratch space in the given directory (removed when done), or else the scratch space of the process
+	with (ScratchSpace(temp_dir) if temp_dir else nullcontext(scratch_space)) as scratch:
+		if engine == 'python':
+			normalized_file = normalize_lines(file_content)
+			# Match the file against all the code blocks in a single scan
+			normalized_blocks = [normalize_lines(block.encode('cp437', errors='ignore').decode('cp437')) for block in chatgpt_code_blocks]
+			blocks_clone_ranges = find_clone_ranges_by_block(normalized_file, normalized_blocks, min_lines)
+		else:
+			# Write the code file and every code block to the scratch space, and compare them all with a single Simian run
+			file_path1 = scratch.write(f"file_code{file_extension}", code_file)
+			block_paths = [scratch.write(f"chat_code_{k}{file_extension}", code_block) for k, code_block in enumerate(chatgpt_code_blocks, start=1)]
 
-	num_blocks = len(chatgpt_code_blocks)
+			# Run Simian (in the long-lived worker) and capture the output
+			returncode, stdout_str = run_simian(['-defaultLanguage=text', f'-threshold={min_lines}', file_path1] + block_paths) if block_paths else (0, '')
 
-	# For each provided code block
-	for i, code_block in enumerate(reversed(chatgpt_code_blocks)):
-		# Write the code block to the temporary file
-		with open(file_path2, 'w', encoding='cp437', errors="ignore") as file2:
-			file2.write(code_block)
+			# If simian finished with error
+			if returncode == 2:
+				print("Error using Simian tool.")
+				return -1
+
+			# Split the clones of the code file by the code block they were found in (none if no code clones were detected)
+			blocks_clone_ranges = parse_simian_ranges_by_block(stdout_str, len(chatgpt_code_blocks)) if returncode != 0 else [[] for _ in chatgpt_code_blocks]
+
+		num_blocks = len(chatgpt_code_blocks)
+
+		# For each provided code block, starting from the last one
+		for i in range(num_blocks):
+			clone_ranges = blocks_clone_ranges[num_blocks - 1 - i]
+
+			# If clone found, extract its info and break loop
+			if clone_ranges:
+				clone_details, actual_lines_cloned = clone_details_from_ranges(file_content, clone_ranges, line_numbers)
+				code_clone['DuplicateLines'] = actual_lines_cloned
+				file_lines = file_content.splitlines()
+				non_empty_lines_num = len([line for line in file_lines if line.strip()])
+				code_clone['Ratio'] = round(actual_lines_cloned / non_empty_lines_num * 100, 1)
+				code_clone['BlockIdx'] = num_blocks - i
+				# Extract specific lines cloned from the code file
+				code_clone['CloneDetails'] = clone_details
+				if actual_lines_cloned:
+					break
+
+	if cache_key:
+		result_cache.put(cache_key, code_clone)
+	return code_clone
 
-		# Define the Simian command
-		cpd_command = f'"{java}" -jar "{simian}" -defaultLanguage=text -threshold={min_lines} {file_path1} {file_path2}'
 
-		# Run the command and capture the output
-		output = subprocess.run(cpd_command, shell=True, text=False, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+@functools.lru_cache(maxsize=None)
+def clone_engine_fingerprint(engine):
+	"""
+	Returns the fingerprint of the version of a clone detection engine: the Simian jar, or the code of the native engine.
+	"""
 
-		# If simian finished with error
-		if output.returncode == 2:
-			print("Error using Simian tool.")
-			return -1
+	if engine == 'python':
+		return file_fingerprint(__file__)
+	return tool_fingerprint(simian)
 
-		# If no code clones detected, continue
-		elif output.returncode == 0:
-			continue
 
-		# Decode the output using utf-8
-		stdout_str = output.stdout.decode('utf-8')
-		
-		duplicates_found = stdout_str.split('Found')
-		duplicate_lines = 0
-		# Define a regular expression pattern to capture the number of lines from info
-		line_num_pattern = r'(\d+) duplicate lines'
-
-		# Get duplicates found between the two temporaty files. (Do not include the duplicated code within the same file)
-		for duplicate in duplicates_found[1:-1].copy():
-			# Check if duplicate refers to both files
-			if 'file_code' in duplicate and 'chat_code' in duplicate:
-				info_lines = [line.strip() for line in duplicate.splitlines()]
-				match = re.search(line_num_pattern, info_lines[0])
-				duplicate_lines += (int(match.group(1)) + 1)
+def normalize_lines(content):
+	"""
+	This function prepares a code snippet for the native clone detection, by collapsing the whitespace 
+	of each line and skipping the blank lines. Simian's other normalizations (e.g. ignoring curly braces or 
+	the case of identifiers) are not emulated.
+	
+	:param content: A string containing the code snippet
+	:returns: A list of tuples (line number, normalized line), one for each non-blank line. Line numbers start from 1.
+	"""
+
+	lines = []
+	for number, line in enumerate(content.splitlines(), start=1):
+		normalized = ' '.join(line.split())
+		if normalized:
+			lines.append((number, normalized))
+	return lines
+
+
+def window_hashes(lines, size):
+	"""
+	This function calculates the Rabin-Karp rolling hash of every window of `size` consecutive lines.
+	
+	:param lines: A list of strings containing the (normalized) lines
+	:param size: An integer specifying the number of lines of each window
+	:returns: A list containing the hash of each window, indexed by the position of its first line.
+	"""
+
+	if len(lines) < size:
+		return []
+
+	line_hashes = [hash(line) % HASH_MOD for line in lines]
+	power = pow(HASH_BASE, size - 1, HASH_MOD)
+
+	window_hash = 0
+	for value in line_hashes[:size]:
+		window_hash = (window_hash * HASH_BASE + value) % HASH_MOD
+	hashes = [window_hash]
+
+	for i in range(size, len(line_hashes)):
+		window_hash = ((window_hash - line_hashes[i - size] * power) * HASH_BASE + line_hashes[i]) % HASH_MOD
+		hashes.append(window_hash)
+	return hashes
+
+
+def find_clone_ranges(file_lines, block_lines, min_lines):
+	"""
+	This function detects the code clones between a code file and a code block in-process, 
+	matching the rolling hashes of windows of `min_lines` lines and extending the matches into maximal runs.
+	
+	:param file_lines: The normalized lines of the code file (as returned by `normalize_lines`)
+	:param block_lines: The normalized lines of the code block (as returned by `normalize_lines`)
+	:param min_lines: An integer specifying the minimum number of lines that a code clone must have
+	:returns: A list of tuples (first line, last line) with the line ranges of the code file that were cloned. 
+	Line numbers start from 1.
+	"""
+
+	return find_clone_ranges_by_block(file_lines, [block_lines], min_lines)[0]
+
+
+def find_clone_ranges_by_block(file_lines, blocks_lines, min_lines):
+	"""
+	This function detects the code clones between a code file and all the code blocks of a sharing at once. 
+	The windows of all the blocks are indexed by their hash (hash -> (block, line)), so the code file is scanned a single time.
+	
+	:param file_lines: The normalized lines of the code file (as returned by `normalize_lines`)
+	:param blocks_lines: A list containing the normalized lines of each code block
+	:param min_lines: An integer specifying the minimum number of lines that a code clone must have
+	:returns: A list containing, for each code block, a list of tuples (first line, last line) 
+	with the line ranges of the code file that were cloned. Line numbers start from 1.
+	"""
+
+	size = max(min_lines, 1)
+	file_text = [line for _, line in file_lines]
+	blocks_text = [[line for _, line in block_lines] for block_lines in blocks_lines]
+
+	# Index the windows of all the code blocks by their hash
+	blocks_index = {}
+	for b, block_text in enumerate(blocks_text):
+		for j, window_hash in enumerate(window_hashes(block_text, size)):
+			blocks_index.setdefault(window_hash, []).append((b, j))
+
+	# Scan the windows of the code file, chaining the matches of the same block and diagonal into runs
+	blocks_runs = [[] for _ in blocks_text]
+	active_runs = {}
+	for i, window_hash in enumerate(window_hashes(file_text, size)):
+		for b, j in blocks_index.get(window_hash, ()):
+			# Verify the match, to rule out hash collisions
+			if file_text[i:i + size] != blocks_text[b][j:j + size]:
+				continue
+			run = active_runs.get((b, i - j))
+			if run and run[1] == i - 1:
+				run[1] = i
 			else:
-				duplicates_found.remove(duplicate)
-
-		# If clone found, extract its info and break loop
-		if duplicates_found and duplicate_lines > 0:
-			# Read the file and print the length and number of lines after writing to a file
-			with open(file_path1, 'r', encoding='cp437') as file:
-				file_content = file.read()
-			clone_details, actual_lines_cloned = extract_clone_details(file_content, duplicates_found)
-			code_clone['DuplicateLines'] = actual_lines_cloned
-			file_lines = file_content.splitlines()
-			non_empty_lines_num = len([line for line in file_lines if line.strip()])
-			code_clone['Ratio'] = round(actual_lines_cloned / non_empty_lines_num * 100, 1)
-			code_clone['BlockIdx'] = num_blocks - i
-			# Extract specific lines cloned from the code file
-			code_clone['CloneDetails'] = clone_details
-			if actual_lines_cloned:
-				break
+				run = [i, i]
+				active_runs[(b, i - j)] = run
+				blocks_runs[b].append(run)
 
-	# Delete the temporary files
-	os.remove(file_path1)
-	if len(chatgpt_code_blocks):
-		os.remove(file_path2)
+	# Map the runs to the line numbers of the code file
+	return [[(file_lines[start][0], file_lines[end + size - 1][0]) for start, end in runs] for runs in blocks_runs]
 
-	return code_clone
+
+def parse_simian_ranges(simian_output):
+	"""
+	This function extracts the line ranges of the code file that are cloned in the code block from Simian's output.
+	Duplicates found within the same file are not included.
+	
+	:param simian_output: A string containing Simian's output
+	:returns: A list of tuples (first line, last line) with the line ranges of the code file that were cloned. 
+	"""
+
+	# Define a regular expression pattern to capture the starting and ending clone line from info
+	pattern = r'Between lines (\d+) and (\d+)'
+
+	clone_ranges = []
+	# The first element is the header and the last one the summary of Simian's output
+	for duplicate in simian_output.split('Found')[1:-1]:
+		# Check if duplicate refers to both files
+		if 'file_code' in duplicate and 'chat_code' in duplicate:
+			info_lines = [line.strip() for line in duplicate.splitlines()]
+			for info in info_lines[1:]:
+				# Keep only the line of the info message that corresponds to info about the block from the file
+				if 'file_code' in info:
+					match = re.search(pattern, info)
+					if match:
+						clone_ranges.append(tuple(map(int, match.groups())))
+	return clone_ranges
+
+
+def parse_simian_ranges_by_block(simian_output, num_blocks):
+	"""
+	This function extracts the line ranges of the code file that are cloned in each code block, from the output of a 
+	single Simian run over the code file and all the code blocks (`chat_code_{k}` files, k starting from 1).
+	Duplicates found within the same file, or only between code blocks, are not included.
+	
+	:param simian_output: A string containing Simian's output
+	:param num_blocks: An integer specifying the number of code blocks
+	:returns: A list containing, for each code block, a list of tuples (first line, last line) with the line ranges 
+	of the code file that were cloned in it.
+	"""
+
+	blocks_clone_ranges = [[] for _ in range(num_blocks)]
+	# The first element is the header and the last one the summary of Simian's output
+	for duplicate in simian_output.split('Found')[1:-1]:
+		file_ranges = []
+		blocks = set()
+		for info in duplicate.splitlines()[1:]:
+			match = re.search(r'Between lines (\d+) and (\d+)', info)
+			if not match:
+				continue
+			if 'file_code' in info:
+				file_ranges.append(tuple(map(int, match.groups())))
+			block = re.search(r'chat_code_(\d+)', info)
+			if block:
+				blocks.add(int(block.group(1)))
+
+		# Add the ranges of the code file to every code block of the duplicate
+		if file_ranges:
+			for k in blocks:
+				blocks_clone_ranges[k - 1].extend(file_ranges)
+	return blocks_clone_ranges
 
 
 def extract_clone_details(code_file, best_match_duplicates):
@@ -117,37 +405,40 @@ def extract_clone_details(code_file, best_match_duplicates):
 	total number of cloned lines.
 	"""
 
-	clone_lines = set()
+	# Join the duplicates back to Simian's output (adding an empty summary, which is skipped)
+	clone_ranges = parse_simian_ranges('Found'.join(best_match_duplicates) + 'Found')
+	return clone_details_from_ranges(code_file, clone_ranges)
 
-	# Define a regular expression pattern to capture the starting and ending clone line from info
-	pattern = r'Between lines (\d+) and (\d+)'
 
-	# Extract info from each info string in the list (The first element of the list is the header)
-	for duplicate in best_match_duplicates[1:]:
-		info_lines = [line.strip() for line in duplicate.splitlines()]
-		for info in info_lines[1:]:
-			# Keep only the line of the info message that corresponds to info about the block from the file
-			if 'file_code' in info:
-				# Use re.search to find the starting and ending line number of the duplicate
-				match = re.search(pattern, info)
-				if match:
-					# Extract the two numbers from the matched groups
-					line1, line2 = map(int, match.groups())
-					# Add the lines of the clone block to the set containing the total cloned lines
-					lines = list(range(line1, line2 + 1))
-					clone_lines = clone_lines|set(map(lambda x: x-1, lines))
-				else:
-					continue
+def clone_details_from_ranges(code_file, clone_ranges, line_numbers=None):
+	"""
+	This function extracts the lines of code that are identified as clones from a given code file.
+	
+	:param code_file: A string that represents the content of a code file
+	:param clone_ranges: A list of tuples (first line, last line) with the cloned line ranges. Line numbers start from 1.
+	:param line_numbers: An (optional) list containing the line number in the real file of each line of `code_file`, 
+	used to label the cloned lines. Defaults to the line numbers of `code_file`.
+	:returns: A tuple containing two values: the lines of code that are identified as clones and the
+	total number of cloned lines.
+	"""
+
+	clone_lines = set()
+	for line1, line2 in clone_ranges:
+		# Add the lines of the clone block to the set containing the total cloned lines
+		clone_lines.update(range(line1 - 1, line2))
 
 	# Get the clone's lines from the code file and return them
 	code_file_lines = code_file.splitlines()
-	code_clone_lines = [f"{i+1}: {code_file_lines[i]}" for i in clone_lines if len(code_file_lines[i].strip()) >= 3]
+	code_clone_lines = [
+		f"{line_numbers[i] if line_numbers else i+1}: {code_file_lines[i]}"
+		for i in clone_lines if len(code_file_lines[i].strip()) >= 3
+	]
 	final_lines_cloned = len(code_clone_lines)
 	code_clone = '\n'.join(code_clone_lines)
 	return code_clone, final_lines_cloned
 
 
-def extract_features(dbobj, temp_dir, sharingidx=0):
+def extract_features(dbobj, temp_dir=None, sharingidx=0):
 	"""
 	This function extracts various features from a given database object (commit or file)
 	and performs code clone detection (Using the Simian tool) 
@@ -155,8 +446,8 @@ def extract_features(dbobj, temp_dir, sharingidx=0):
 	'before' and 'after' versions refer to the commited file's versions before and after the insertion of Chatgpt generated code.
 	
 	:param dbobj: A dictionary that contains information about a database object (commit or file)
-	:param temp_dir: A string that represents the temporary directory where
-	the code clone detection process will store temporary files
+	:param temp_dir: An (optional) string that represents the temporary directory where
+	the code clone detection process will store temporary files. Defaults to the scratch space of the process.
 	:param sharingidx: An (optional) integer value that determines which ChatgptSharing object
 	from the database object (`dbobj`) to use for feature extraction. Defaults to 0.
 	:returns: A dictionary containing various features extracted from the input `dbobj`. 
@@ -185,7 +476,8 @@ def extract_features(dbobj, temp_dir, sharingidx=0):
 
 	# Create a list of file's according to the type of dbobj
 	if dbobj['Type'] == 'commit':
-		file_list = dbobj['CommitContent']['files']
+		# (A commit that no longer exists on GitHub has no downloaded content)
+		file_list = dbobj.get('CommitContent', {}).get('files', [])
 		source_type = 'commit'
 	else:
 		file_list = [dbobj]
@@ -198,6 +490,9 @@ def extract_features(dbobj, temp_dir, sharingidx=0):
 	# Define a list to store the indexes of the files were code clone detections were found
 	features['CodeCloneDetectedIdxs'] = [] 
 
+	# Define a list to store the files whose quality violations will be calculated (with their features)
+	quality_jobs = []
+
 	# For each commited file
 	for file in file_list:
 
@@ -206,9 +501,11 @@ def extract_features(dbobj, temp_dir, sharingidx=0):
 			if 'patch' not in file:
 				continue
 			else:
-				# Get file's content from patch (current and previous versions)
-				content = get_content_from_patch(file['patch'], 'current')
-				previous_content = get_content_from_patch(file['patch'], 'previous')
+				# Get file's content from patch (current and previous versions), and the real file line of each content line
+				parsed_patch = parse_patch(file['patch'])
+				content = parsed_patch.content('current')
+				previous_content = parsed_patch.content('previous')
+				line_numbers = parsed_patch.line_numbers['current']
 				
 				# Add them to file as attributes
 				file['Content'] = content
@@ -219,10 +516,11 @@ def extract_features(dbobj, temp_dir, sharingidx=0):
 			# Get file's content and decode it
 			base64_content = file['Content']
 			content = base64.b64decode(base64_content).decode('utf-8')
+			line_numbers = None
 
 			# Get file's previous content if existed
 			if 'FileHistory' in file and 'patch' in file['FileHistory']:
-				previous_content = get_content_from_patch(file['FileHistory']['patch'], 'previous')
+				previous_content = parse_patch(file['FileHistory']['patch']).content('previous')
 				file['PrevContent'] = previous_content
 			else:
 				file['PrevContent'] = ''
@@ -247,11 +545,11 @@ def extract_features(dbobj, temp_dir, sharingidx=0):
 
 			# Detect copy-pasted code parts (code clones), between the file and the Chatgpt's provided code blocks
 			min_lines = 2
-			code_clone = detect_code_clone(content, codeblocks, file_extension, min_lines, temp_dir)
+			code_clone = detect_code_clone(content, codeblocks, file_extension, min_lines, temp_dir, line_numbers=line_numbers)
 
-			# If simian finished with error
+			# If simian finished with error (the quality analysis of the previous files is still completed)
 			if code_clone == -1:
-				return features
+				break
 				
 			# If no code clones where found, set the results accordingly
 			if 'DuplicateLines' not in code_clone or code_clone['DuplicateLines'] == 0: # If empty
@@ -293,17 +591,21 @@ def extract_features(dbobj, temp_dir, sharingidx=0):
 					file_features['QualityAnalysis'] = "Language not supported by PMD-check"
 				
 				else:
+					# Queue the file, to calculate the violations of all the files concurrently
 					file['Extension'] = file_extension
-					quality_result = before_after_violations(file)
-					
-					# If quality analysis finished with error
-					if quality_result == -1:
-						file_features['QualityAnalysis'] = "Error during quality analysis"
-					else:
-						# Add Quality Analysis to features
-						file_features['QualityAnalysis'] = quality_result
+					quality_jobs.append((file_features, file))
 
 		# Add file features to the list
 		features['FileAnalysis'].append(file_features)
+
+	# Calculate the quality violations of the queued files (all their versions are linted concurrently)
+	quality_results = before_after_violations_many([file for _, file in quality_jobs]) if quality_jobs else []
+	for (file_features, _), quality_result in zip(quality_jobs, quality_results):
+		# If quality analysis finished with error
+		if quality_result == -1:
+			file_features['QualityAnalysis'] = "Error during quality analysis"
+		else:
+			# Add Quality Analysis to features
+			file_features['QualityAnalysis'] = quality_result
 			
 	return features
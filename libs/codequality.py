@@ -1,9 +1,33 @@
 import os
 import shutil
-import tempfile
+import hashlib
+import queue
+import functools
 import subprocess
 from collections import defaultdict
-from properties import pmd, sourcemeterjs, sourcemeterdir
+from concurrent.futures import ThreadPoolExecutor
+from properties import pmd, pmdworkers, analysisworkers, sourcemeterjs, sourcemeterdir
+from libs.scratch import ScratchSpace, scratch_space
+from libs.pmdreport import Violation, parse_report, parse_json_report
+from libs.resultcache import result_cache
+from libs.fingerprint import file_fingerprint, tool_fingerprint
+
+# PMD ruleset of JavaScript
+JAVASCRIPT_RULESET = os.path.join('pmdrulesets', 'javascriptruleset.xml')
+
+# Maximum number of code blocks analyzed by a single PMD run
+PMD_BATCH_SIZE = 1000
+
+def default_pmd_workers():
+	"""
+	Returns the number of concurrent PMD processes of an analysis process: the PMDWORKERS environment variable if set,
+	else at most 4, sharing the CPUs with the other analysis processes (ANALYSISWORKERS), since each of them starts its own PMD processes.
+	"""
+
+	if pmdworkers:
+		return int(pmdworkers)
+	analysis_processes = int(analysisworkers) if analysisworkers else 1
+	return max(1, min(4, (os.cpu_count() or 1) // analysis_processes))
 
 
 def before_after_violations(file):
@@ -16,63 +40,116 @@ def before_after_violations(file):
 	quality violations found for each version of the file (current and previous versions). The keys in
 	the dictionary represent the file versions ("Current" and "Previous"), and the values represent the
 	total number of violations found in each version. If no violations are found for a version, the
-	value will be 0.
+	value will be 0. The 'Details' key contains the rule and line of each violation found, for each version.
 	"""
 
-	# Define dictionary to store number of violations found for each version
-	violations = {}
+	return before_after_violations_many([file])[0]
 
-	# Retrieve the file's extension
-	file_extension = file['Extension']
 
-	# Retrieve file's content from patch (current and previous versions)
-	# Check ff previous content exist (File was not created during the specific commit)
-	if len(file['PrevContent']):
-		version_list = {"Current": file['Content'], "Previous": file['PrevContent']}
-	else:
-		# Create dictionary containing only the current content
-		version_list = {"Current": file['Content']}
-		violations["Previous"] = "No previous file version"
+def before_after_violations_many(files, max_workers=None):
+	"""
+	This function calculates the quality violations of the current and the previous versions of several files 
+	(e.g. all the JavaScript files of a commit). Every version of every file is a separate lint job, and the jobs
+	run concurrently on a bounded pool of PMD processes.
+	
+	:param files: A list of dictionaries containing information about commited files
+	:param max_workers: An (optional) integer specifying the maximum number of concurrent PMD processes. 
+	Defaults to `default_pmd_workers()`.
+	:returns: A list containing the result of `before_after_violations` for each file, in the same order as `files`.
+	"""
 
-	# For each file version (before-after Chatgpt code insertion), calculate the quality violations
-	for version, file_content in version_list.items():
+	# Define dictionaries to store number of violations found for each version, and their details
+	results = [{} for _ in files]
+	details = [{} for _ in files]
+
+	# Create a lint job for each file version (before-after Chatgpt code insertion)
+	jobs = []
+	for i, file in enumerate(files):
+		# Retrieve file's content from patch (current and previous versions)
+		# Check ff previous content exist (File was not created during the specific commit)
+		jobs.append((i, "Current", file['Content'], file['Extension']))
+		if len(file['PrevContent']):
+			jobs.append((i, "Previous", file['PrevContent'], file['Extension']))
+		else:
+			results[i]["Previous"] = "No previous file version"
 
-		# Create temporary file to store the code file's content
-		with tempfile.NamedTemporaryFile(mode='w', delete=False, encoding='cp437', errors="ignore", suffix=file_extension) as temp_file:
-			temp_file.write(file_content)
+	max_workers = max(1, min(max_workers or default_pmd_workers(), len(jobs)))
 
-		# Get temporary file's path
-		temp_file_path = temp_file.name
+	# Every running job uses one of a fixed set of scratch slots, so the same files are reused by all the calls
+	slots = queue.Queue()
+	for slot in range(max_workers):
+		slots.put(f"version_{slot}")
 
-		# Create the ruleset relative path according to the file's language
-		ruleset_path = f"pmdrulesets\javascriptruleset.xml"
+	def run_job(job):
+		slot = slots.get()
+		try:
+			return lint_file(job[2], job[3], slot)
+		finally:
+			slots.put(slot)
 
-		# Define the PMD check command
-		cpd_command = f"{pmd} check {temp_file_path} -f text --no-cache -R {ruleset_path}"
-		
-		# Run the command and capture the output
-		output = subprocess.run(cpd_command, shell=True, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+	with ThreadPoolExecutor(max_workers=max_workers) as executor:
+		records_list = list(executor.map(run_job, jobs))
 
-		# If quality violations found
-		if output.returncode == 4:
-			# Compute the total number of violations and save it to dictionary
-			output_message = output.stdout
-			total_violations = len(output_message.splitlines())
-			violations[version] = total_violations
+	# Reassemble the results of each file
+	for (i, version, _, _), records in zip(jobs, records_list):
+		if results[i] == -1:
+			continue
 
-		# If no quality violations found
-		elif output.returncode == 0: 
-			violations[version] = 0
-		
 		# If PMD-check finished with error
-		else:
+		if records == -1:
 			print('Error in before-after quality analysis')
-			return -1
+			results[i] = -1
+			continue
 
-	return violations
+		# Save the total number of violations and the line of each one
+		results[i][version] = len(records)
+		details[i][version] = [{'Rule': record.rule, 'Line': record.line} for record in records]
+
+	for i, result in enumerate(results):
+		if result != -1:
+			result['Details'] = details[i]
+	return results
 
 
-def block_quality_violations(dbobj, idx=0):
+def lint_file(file_content, file_extension, slot='version'):
+	"""
+	This function runs the PMD check for the content of a code file (or serves its result from the result cache).
+	
+	:param file_content: A string containing the content of the code file
+	:param file_extension: A string containing the file extension (including the dot)
+	:param slot: An (optional) string containing the name of the scratch file (without extension). Concurrent calls must use different slots
+	:returns: A list of the violations (`Violation` records) found. The function returns (-1) if the PMD finished with error.
+	"""
+
+	if result_cache:
+		cache_key = result_cache.key('pmd-file', file_content, file_extension, pmd_fingerprint())
+		cached = result_cache.get(cache_key)
+		if cached is not None:
+			return [Violation(*record) for record in cached]
+
+	# Write the code file's content to the scratch space (reusing the file of the slot)
+	temp_file_path = scratch_space.write(f"{slot}{file_extension}", file_content)
+
+	# Define the PMD check command
+	cpd_command = f"{pmd} check {temp_file_path} -f json --no-cache -R {JAVASCRIPT_RULESET}"
+	
+	# Run the command and capture the output
+	output = subprocess.run(cpd_command, shell=True, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+	# If PMD-check finished successfully (4: violations found, 0: no violations found), parse its report
+	if output.returncode not in (0, 4):
+		return -1
+	try:
+		records = parse_report(output.stdout, 'json')
+	except ValueError:
+		return -1
+
+	if result_cache:
+		result_cache.put(cache_key, records)
+	return records
+
+
+def block_quality_violations(dbobj, idx=0, block_violations=None):
 	"""
 	This function calculates the number of quality violations in code blocks of a shared
 	conversation and returns the updated conversation object. Also, for every code clone detected in the dbobj, 
@@ -81,6 +158,9 @@ def block_quality_violations(dbobj, idx=0):
 	:param dbobj: A database object that contains the information about a commit or a file object
 	:param idx: An optional parameter that specifies the index of the link in the `ChatgptSharing` list.
 	If not provided, it defaults to 0, indicating the first shared link it the list
+	:param block_violations: An optional dictionary of the PMD violations of the code blocks already analyzed (e.g. by 
+	`prefetch_block_violations` for all the links of a collection), by `content_key`. The missing blocks are analyzed and added to it.
+	If not provided, only the blocks of the sharing are analyzed.
 	:returns: The updated `sharing` object with the added `Violations` attribute for each supported
 	code block in each conversation, and with `Copied` attribute added to every code block that was copied.
 	The function returns (-1) if the PMD finished with error.
@@ -123,6 +203,21 @@ def block_quality_violations(dbobj, idx=0):
 								  'InnaccurateNumericLiteral': 'ErrorProne'
 								  }
 
+	# Run PMD once for all the JavaScript code blocks of the shared link (skipping the blocks already analyzed)
+	javascript_blocks = [
+		code['Content']
+		for conversation in sharing.get('Conversations', [])
+		for code in conversation['ListOfCode']
+		if code['Type'] == 'javascript'
+	]
+	if block_violations is None:
+		block_violations = {}
+	# If PMD-check finished with error (now, or for a block analyzed before)
+	if prefetch_block_violations(javascript_blocks, block_violations) == -1 or \
+			any(block_violations[content_key(content)] == -1 for content in javascript_blocks):
+		print('Error in generated-code quality analysis')
+		return -1
+
 	# For every generated code block in every conversation of the shared link, calculate the violations
 	for i, conversation in enumerate(sharing.get('Conversations', [])):
 		# Define variable to specify whether the content of the conversation changed, in order to save it
@@ -137,54 +232,23 @@ def block_quality_violations(dbobj, idx=0):
 			# If type of code is supported
 			if code['Type'] == 'javascript':
 
-				# Create temporary file to store the code file's content
-				with tempfile.NamedTemporaryFile(mode='w', delete=False, encoding='cp437', errors="ignore", suffix='.js') as temp_file:
-					temp_file.write(code['Content'])
-
-				# Get temporary file's path
-				temp_file_path = temp_file.name
-
-				# Create the ruleset relative path according to the file's language
-				ruleset_path = f"pmdrulesets\{code['Type']}ruleset.xml"
-
-				# Define the PMD check command
-				cpd_command = f"{pmd} check {temp_file_path} -f text --no-cache -R {ruleset_path}"
-				
-				# Run the command and capture the output
-				output = subprocess.run(cpd_command, shell=True, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-				# If quality violations found
-				if output.returncode == 4:
-					# Extract the violations by category found and save it to dictionary
-					output_message = output.stdout
-
-					# For each supported violation
-					for name, category in javascript_violations.items():
-						# Check how many times it exist in the output message
-						count = output_message.count(name)
-						if count:
-							total_violations += count
-							violations_by_cat[category] += count
-							violations_by_name[name] += count
-
-					# Formulate the final dictionary containing the information to be stored to the db
-					code['Violations'] = {'Total': total_violations}
-					code['Violations'].update({'ViolationsByCat': violations_by_cat})
-					code['Violations'].update({'ViolationsByName': violations_by_name})
-					conversation['ListOfCode'][j] = code
-					conv_changed = True 
-
-				elif output.returncode == 0:
-					code['Violations'] = {'Total': total_violations}
-					code['Violations'].update({'ViolationsByCat': violations_by_cat})
-					code['Violations'].update({'ViolationsByName': violations_by_name})
-					conversation['ListOfCode'][j] = code
-					conv_changed = True
-				
-				# If PMD-check finished with error
-				else:
-					print('Error in generated-code quality analysis')
-					return -1
+				violation_details = []
+
+				# For each violation reported by PMD for the block, count the supported ones
+				for record in block_violations[content_key(code['Content'])]:
+					if record.rule in javascript_violations:
+						total_violations += 1
+						violations_by_cat[javascript_violations[record.rule]] += 1
+						violations_by_name[record.rule] += 1
+						violation_details.append({'Rule': record.rule, 'Line': record.line, 'Priority': record.priority})
+
+				# Formulate the final dictionary containing the information to be stored to the db
+				code['Violations'] = {'Total': total_violations}
+				code['Violations'].update({'ViolationsByCat': violations_by_cat})
+				code['Violations'].update({'ViolationsByName': violations_by_name})
+				code['Violations'].update({'Details': violation_details})
+				conversation['ListOfCode'][j] = code
+				conv_changed = True
 		
 		if conv_changed:
 			sharing['Conversations'][i] = conversation
@@ -192,6 +256,150 @@ def block_quality_violations(dbobj, idx=0):
 	return sharing
 
 
+def content_key(content):
+	"""
+	Returns the key of a code snippet in the cache of PMD results (the SHA-256 hash of its content).
+	"""
+
+	return hashlib.sha256(content.encode('utf-8', errors='surrogatepass')).hexdigest()
+
+
+def run_pmd_batch(contents, ruleset_path=JAVASCRIPT_RULESET, file_extension='.js'):
+	"""
+	This function runs the PMD check once for several code snippets. The snippets are written to the files of
+	a single directory, PMD analyzes the whole directory and its JSON report is mapped back to the snippets by file name.
+	The snippets PMD fails to process (e.g. that cannot be parsed) are reported in the same run, without failing the others.
+	
+	:param contents: A list of strings containing the code snippets
+	:param ruleset_path: A string containing the path of the PMD ruleset
+	:param file_extension: A string containing the file extension of the snippets (including the dot)
+	:returns: A list containing, for each snippet, the list of its violations (`Violation` records), or (-1) for the
+	snippets PMD failed to process. The function returns (-1) if the PMD finished with error (e.g. it crashed).
+	"""
+
+	if not contents:
+		return []
+
+	with ScratchSpace(prefix='pmd-') as scratch:
+		for k, content in enumerate(contents):
+			scratch.write(f"block_{k}{file_extension}", content)
+
+		# Define the PMD check command
+		cpd_command = f"{pmd} check {scratch.directory} -f json --no-cache --no-fail-on-error -R {ruleset_path}"
+
+		# Run the command and capture the output
+		output = subprocess.run(cpd_command, shell=True, text=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+	# If PMD-check finished with error (4: violations found, 0: no violations found)
+	if output.returncode not in (0, 4):
+		return -1
+
+	try:
+		records, processing_errors = parse_json_report(output.stdout)
+	except ValueError:
+		return -1
+
+	def snippet_index(file_path):
+		# Map a file to its snippet, using the index in the file name
+		file_name = os.path.splitext(os.path.basename(file_path))[0]
+		return int(file_name[len('block_'):])
+
+	violations = [[] for _ in contents]
+	for record in records:
+		violations[snippet_index(record.file)].append(record)
+	for file_path in processing_errors:
+		violations[snippet_index(file_path)] = -1
+	return violations
+
+
+def run_pmd_batch_isolating_errors(contents, ruleset_path=JAVASCRIPT_RULESET, file_extension='.js'):
+	"""
+	This function runs `run_pmd_batch` for several code snippets, and if PMD finishes with error, analyzes the snippets
+	again in halves (repeatedly), so that a snippet that crashes PMD does not discard the results of the rest of its batch 
+	(the snippets PMD cannot parse are already reported by the single run). Before splitting, PMD is checked with an empty snippet, to avoid a PMD run per snippet 
+	when PMD itself does not work.
+	
+	:param contents: A list of strings containing the code snippets
+	:param ruleset_path: A string containing the path of the PMD ruleset
+	:param file_extension: A string containing the file extension of the snippets (including the dot)
+	:returns: A list containing, for each snippet, the list of its violations (`Violation` records), or (-1) for the
+	snippets PMD failed on. The function returns (-1) if PMD does not work at all.
+	"""
+
+	violations = run_pmd_batch(contents, ruleset_path, file_extension)
+	if violations != -1:
+		return violations
+	if len(contents) > 1 and run_pmd_batch([''], ruleset_path, file_extension) == -1:
+		return -1
+
+	def retry(pieces):
+		# Analyze the halves of a failed batch, down to single snippets
+		if len(pieces) == 1:
+			return [-1]
+		middle = len(pieces) // 2
+		results = []
+		for half in (pieces[:middle], pieces[middle:]):
+			half_violations = run_pmd_batch(half, ruleset_path, file_extension)
+			results.extend(half_violations if half_violations != -1 else retry(half))
+		return results
+
+	return retry(contents)
+
+
+def prefetch_block_violations(contents, block_violations, batch_size=PMD_BATCH_SIZE):
+	"""
+	This function calculates the PMD violations of several JavaScript code blocks with as few PMD runs as possible
+	(one per `batch_size` blocks), and stores them in `block_violations`. Blocks already in it are skipped, 
+	so it can be called for the blocks of a whole collection before the analysis, or for the blocks of a single sharing.
+	
+	:param contents: A list of strings containing the code blocks
+	:param block_violations: A dictionary of the PMD violations (lists of `Violation` records) of the code blocks, by `content_key`
+	:param batch_size: An integer specifying the maximum number of blocks analyzed by a single PMD run
+	:returns: The number of the blocks analyzed. The function returns (-1) if the PMD finished with error for any of the blocks 
+	(the results of the rest of the blocks are still stored, and the failed blocks are stored as (-1), so that they are not analyzed again).
+	"""
+
+	# Keep the unique blocks that were not already analyzed (in this run, or in a previous one if the result cache is used)
+	pending = {}
+	for content in contents:
+		key = content_key(content)
+		if key in block_violations or key in pending:
+			continue
+		if result_cache:
+			cached = result_cache.get(result_cache.key('pmd-block', key, pmd_fingerprint()))
+			if cached is not None:
+				block_violations[key] = [Violation(*record) for record in cached]
+				continue
+		pending[key] = content
+
+	keys = list(pending)
+	failed = False
+	for start in range(0, len(keys), batch_size):
+		batch_keys = keys[start:start + batch_size]
+		violations = run_pmd_batch_isolating_errors([pending[key] for key in batch_keys])
+		if violations == -1:
+			return -1
+
+		# Keep the results of the blocks that were analyzed (the failures are not kept in the result cache)
+		for key, records in zip(batch_keys, violations):
+			block_violations[key] = records
+			if records == -1:
+				failed = True
+				continue
+			if result_cache:
+				result_cache.put(result_cache.key('pmd-block', key, pmd_fingerprint()), records)
+
+	return -1 if failed else len(keys)
+
+
+@functools.lru_cache(maxsize=None)
+def pmd_fingerprint():
+	"""
+	Returns the fingerprint of the PMD version and the JavaScript ruleset, that the cached PMD results depend on.
+	"""
+
+	return [tool_fingerprint(pmd), file_fingerprint(JAVASCRIPT_RULESET)]
+
 
 def run_sourcemeter(code_blocks, proj_name):
 	"""
@@ -1,4 +1,14 @@
+import time
 import pymongo
+from pymongo import UpdateOne, DeleteOne, InsertOne
+from pymongo.errors import OperationFailure
+
+# Indexes of the fields used by the lookups of the pipeline (preprocessing, analysis, results)
+INDEXES = {
+    'commits': ['URL', 'Sha', 'NumericID', 'ChatgptSharing.Conversations.ListOfCode.Type'],
+    'files': ['URL', 'ObjectSha', 'NumericID', 'ChatgptSharing.Conversations.ListOfCode.Type'],
+    'links': ['URL', 'MentionedSource', 'NumericID'],
+}
 
 class DBManager:
     """
@@ -26,5 +36,150 @@ class DBManager:
     def delete(self, collection_name, filter):
         self.db[collection_name].delete_many(filter)
 
+    def renumber(self, collection_name, field='NumericID'):
+        """
+        Sets `field` of every document of the collection to a contiguous number (starting from 1), in the order
+        of insertion (`_id`), with a single server-side aggregation. MongoDB versions older than 5.0 do not
+        support `$setWindowFields`, so a single unordered bulk write is used for them instead.
+        """
+        collection = self.db[collection_name]
+        pipeline = [
+            {'$setWindowFields': {'sortBy': {'_id': 1}, 'output': {field: {'$documentNumber': {}}}}},
+            {'$project': {field: True}},
+            {'$merge': {'into': collection_name, 'on': '_id', 'whenMatched': 'merge', 'whenNotMatched': 'discard'}}
+        ]
+        try:
+            collection.aggregate(pipeline, allowDiskUse=True)
+        except OperationFailure:
+            ids = [document['_id'] for document in collection.find({}, {'_id': True}).sort('_id', pymongo.ASCENDING)]
+            operations = [UpdateOne({'_id': _id}, {'$set': {field: i}}) for i, _id in enumerate(ids, start=1)]
+            if operations:
+                collection.bulk_write(operations, ordered=False)
+
+    def collection_hash(self, collection_name):
+        """
+        Returns a hash of the content of the collection, calculated by the server (used to detect changes).
+        """
+        try:
+            return self.db.command('dbHash', collections=[collection_name])['collections'].get(collection_name)
+        except OperationFailure:
+            # If the command is not permitted, fall back to the number of documents and the latest ID
+            collection = self.db[collection_name]
+            latest = collection.find_one({}, {'_id': True}, sort=[('_id', pymongo.DESCENDING)])
+            return f"{collection.estimated_document_count()}:{latest['_id'] if latest else None}"
+
+    def ensure_indexes(self, explain=False):
+        """
+        Creates (if they do not already exist) the indexes declared in `INDEXES`.
+        If `explain` is set, an equality query is executed on every indexed field and its query plan
+        statistics are printed, to verify that the lookups use the index instead of a collection scan.
+        """
+        for collection_name, fields in INDEXES.items():
+            collection = self.db[collection_name]
+            for field in fields:
+                collection.create_index([(field, pymongo.ASCENDING)])
+
+        if explain:
+            self.explain_indexes()
+
+    def explain_indexes(self):
+        """
+        Prints the winning plan and the number of examined documents of an equality query on every
+        field declared in `INDEXES`, using a value sampled from the collection.
+        """
+        for collection_name, fields in INDEXES.items():
+            for field in fields:
+                value = self._sample_value(collection_name, field)
+                if value is None:
+                    print(f"{collection_name}.{field}: no documents to query")
+                    continue
+
+                explanation = self.db.command('explain', {'find': collection_name, 'filter': {field: value}}, verbosity='executionStats')
+                stages = []
+                plan = explanation['queryPlanner']['winningPlan']
+                plan = plan.get('queryPlan', plan) # slot-based execution engine
+                while plan:
+                    stages.append(plan['stage'])
+                    plan = plan.get('inputStage')
+                stats = explanation['executionStats']
+                print(f"{collection_name}.{field}: {' <- '.join(stages)} | "
+                      f"Returned {stats['nReturned']}, Keys examined {stats['totalKeysExamined']}, "
+                      f"Documents examined {stats['totalDocsExamined']}")
+
+    def _sample_value(self, collection_name, field):
+        # Get the value of the field from a document of the collection (flattening array paths)
+        result = list(self.db[collection_name].aggregate([
+            {'$match': {field: {'$exists': True}}},
+            {'$limit': 1},
+            {'$project': {'_id': False, 'Value': f'${field}'}}
+        ]))
+        values = [result[0].get('Value')] if result else []
+        while values:
+            value = values.pop(0)
+            if isinstance(value, list):
+                values = value + values
+            elif value is not None:
+                return value
+        return None
+
+    def bulk_writer(self, collection_name, batch_size=1000, flush_interval=5.0):
+        return BulkWriter(self.db[collection_name], batch_size, flush_interval)
+
+    def close(self):
+        self.client.close()
+
+
+class BulkWriter:
+    """
+    Class for buffering write operations on a collection and sending them as unordered bulk writes.
+    The buffer is flushed when it reaches `batch_size` operations, when `flush_interval` seconds have
+    passed since the last flush, and when the writer is closed (or its `with` block exits).
+    Since the operations of a batch are unordered, no two buffered operations should depend on each other.
+    """
+
+    def __init__(self, collection, batch_size=1000, flush_interval=5.0):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.operations = []
+        self.last_flush = time.monotonic()
+        self.counts = {'Inserted': 0, 'Matched': 0, 'Modified': 0, 'Deleted': 0, 'Upserted': 0, 'Batches': 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def update(self, filter, update, upsert=False):
+        self.add(UpdateOne(filter, update, upsert=upsert))
+
+    def delete(self, filter):
+        self.add(DeleteOne(filter))
+
+    def insert(self, document):
+        self.add(InsertOne(document))
+
+    def add(self, operation):
+        self.operations.append(operation)
+        if len(self.operations) >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.operations:
+            return
+
+        result = self.collection.bulk_write(self.operations, ordered=False)
+        self.operations = []
+
+        # Keep the total number of documents affected
+        self.counts['Inserted'] += result.inserted_count
+        self.counts['Matched'] += result.matched_count
+        self.counts['Modified'] += result.modified_count
+        self.counts['Deleted'] += result.deleted_count
+        self.counts['Upserted'] += result.upserted_count
+        self.counts['Batches'] += 1
+
     def close(self):
-        self.client.close()
\ No newline at end of file
+        self.flush()
@@ -1,126 +1,402 @@
+import time
+import random
+import asyncio
 import requests
-import json
-from properties import githubapikey
+import aiohttp
+from properties import githubapikey, httpcachedir, httpcachemaxmb, offline
+from libs.httpcache import ResponseCache, CacheMiss
 
-def download_commits_content(commits):
+# Base URL of GitHub's REST API
+GITHUB_API = "https://api.github.com"
+
+# Number of commits of a file's history that are searched (same as the default page of the REST API)
+HISTORY_PAGE_SIZE = 30
+
+# GraphQL query returning the commits of a file's history and the SHA of the file's blob in each commit
+FILE_HISTORY_QUERY = """
+query($owner: String!, $name: String!, $path: String!, $first: Int!) {
+  repository(owner: $owner, name: $name) {
+    defaultBranchRef {
+      target {
+        ... on Commit {
+          history(path: $path, first: $first) {
+            nodes { oid file(path: $path) { oid } }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+# Number of remaining API requests below which the requests are paused until the rate limit resets
+RATE_LIMIT_THRESHOLD = 10
+
+# On-disk cache of the API responses (enabled if a cache directory is set)
+response_cache = None
+if httpcachedir:
+	response_cache = ResponseCache(httpcachedir, int(httpcachemaxmb or 512) * 1024 * 1024, offline=offline == '1')
+
+# Number of processed entries between two progress reports
+PROGRESS_STEP = 50
+
+
+def report_progress(done, total, name):
+	"""
+	Prints the progress of a download every `PROGRESS_STEP` entries (and when it completes).
 	"""
-	Takes a list of commits as input and retrieves the content of each commit using the GitHub API.
+
+	if done and (done % PROGRESS_STEP == 0 or done == total):
+		print(f"Downloaded {done}/{total} {name}")
+
+
+def download_files_history(files, on_result=None, api_url=GITHUB_API):
+	"""
+	Takes a list of files as input and retrieves the commit content for the specific file using the GitHub API.
+	The commit that introduced the file's version is resolved with a single GraphQL query over the file's 
+	history (comparing the blob SHA of the file in every commit with the file's `ObjectSha`), and only the commits
+	having the file's blob are downloaded (the most recent first, until one lists the file, e.g. not a merge commit). 
+	Commit payloads are cached, so files of the same repository share the requests.
+	Files whose commit is not found (or whose repository no longer exists) are marked as resolved, so that a 
+	resumed download skips them. Files whose requests fail are reported and left to be retried by the next run.
 	
-	:param commits: A list of dictionaries, where each dictionary represents a commit object.
-	:returns: A list of dictionaries containing the updates to be made to the 'commits' collection. 
-	Each dictionary contains the commit's ID and content attribute. If the GitHub's API
-	remaining request number is low, return (-1)
+	:param files: A list of dictionaries, where each dictionary represents a file object.
+	:param on_result: An (optional) function called with each update as soon as it is downloaded 
+	(e.g. to persist it, so that an interrupted download can be resumed).
+	:param api_url: An (optional) string that represents the base URL of the API (e.g. a local server for testing).
+	:returns: A list of dictionaries containing the updates to be made to the 'files' collection. 
+	Each dictionary contains the file's ID, the `HistoryResolved` flag and (if the commit was found) the history 
+	attribute. If the GitHub's API remaining request number is low, return (-1)
 	"""
 	
 	# Define a list to store dictionaries with the commit's ID and content attribute
 	update_list = []
+	failed = 0
 
-	# Use GitHub token to achieve better maximum API call rate
-	headers = {'Authorization': f'token {githubapikey}'}
+	# Use GitHub token to achieve better maximum API call rate (and one session to reuse the connections)
+	session = requests.Session()
+	session.headers.update({'Authorization': f'token {githubapikey}'})
 
-	for commit in commits:
-	
-		update_dict = {}
-		# Get commit's ID and store it to dictionary
-		update_dict['_id'] = commit['_id']
+	# Cache of the files of the downloaded commits, by (repository, commit sha)
+	commit_cache = {}
 
-		# Get commit's reponame and sha 
-		reponame = commit['RepoName']
-		sha = commit['Sha']
-		apiurl = "https://api.github.com/repos/" + reponame + "/commits/" + sha
+	for f, file in enumerate(files, start=1):
+		report_progress(f - 1, len(files), 'files')
 
 		try:
-			# API call to get GitHub's commit information
-			response = requests.get(apiurl, headers = headers)
+			committed_file = resolve_file_history(session, file, commit_cache, api_url=api_url)
+		except RateLimitReached:
+			print("GitHub: X-RateLimit-Remaining is low, please try again later.")
+			return -1
+		except (requests.RequestException, CacheMiss) as error:
+			# The repository (or the file's commit) no longer exists, so the file has no history
+			if isinstance(error, requests.HTTPError) and error.response is not None and error.response.status_code == 404:
+				committed_file = None
+			else:
+				print(f"Could not download the history of '{file['FilePath']}' ({file['RepoName']}): {error}")
+				failed += 1
+				continue
+
+		# Mark the file as resolved, even if its commit was not found
+		update_dict = {'_id': file['_id'], 'HistoryResolved': True}
+		if committed_file:
+			update_dict['FileHistory'] = committed_file
+		# Add update dictionary to update list
+		update_list.append(update_dict)
+		if on_result:
+			on_result(update_dict)
+
+	report_progress(len(files), len(files), 'files')
+	if failed:
+		print(f"The history of {failed} files could not be downloaded, run again to retry them")
+	return update_list
+
 
-			# Store API response to update's dictionary
-			update_dict['CommitContent'] = json.loads(response.text)
+class RateLimitReached(Exception):
+	"""
+	Raised when the remaining number of GitHub API requests is low.
+	"""
 
-			# Add update dictionary to update list
-			update_list.append(update_dict)
 
+class RequestFailed(Exception):
+	"""
+	Raised by `fetch_json` when a request did not succeed. `status` is the HTTP status of the last response,
+	or None if no response was received (e.g. connection errors, or a response not cached in offline mode).
+	"""
+
+	def __init__(self, url, status=None):
+		super().__init__(f"{status or 'No response'} for url: {url}")
+		self.status = status
+
+
+def get_json(session, url, params=None, json=None, cache=None, max_retries=5, backoff=1.0):
+	"""
+	Performs a GET (or a POST, if `json` is given) request to the GitHub API and returns the decoded response.
+	Connection errors, server errors and (secondary) rate limit responses are retried with exponential backoff,
+	honoring the `Retry-After` header (as in `fetch_json`).
+	If a response cache is used, immutable responses are served from it, the rest are revalidated with 
+	their ETag (a '304 Not Modified' response does not count against the rate limit), and in offline mode
+	every response is served from it.
+	GraphQL queries (POST) have no ETag, so online they are always sent again and count against the rate limit 
+	(e.g. the file history queries, whose result changes with the default branch); only offline re-runs use no requests.
+	Raises RateLimitReached if the remaining number of requests is low, CacheMiss if a response is not cached 
+	in offline mode, and a requests.RequestException (e.g. an HTTPError for a '404 Not Found' response) if the 
+	request did not succeed.
+	"""
+
+	cache = cache or response_cache
+	headers = {}
+	entry = None
+
+	if cache:
+		key = cache.key(url, params, json)
+		entry = cache.get(key)
+		if cache.offline:
+			if entry is None:
+				raise CacheMiss(url)
+			return entry['Body']
+		if entry is not None:
+			if cache.is_immutable(url):
+				return entry['Body']
+			if entry['ETag']:
+				headers['If-None-Match'] = entry['ETag']
+
+	for attempt in range(max_retries + 1):
+		try:
+			if json is not None:
+				response = session.post(url, params=params, json=json, headers=headers)
+			else:
+				response = session.get(url, params=params, headers=headers)
+		except (requests.ConnectionError, requests.Timeout) as connection_error:
+			error, retry_after = connection_error, None
+		else:
 			# Check GitHub's API call rate limit
 			if 'X-RateLimit-Remaining' in response.headers:
-				if int(response.headers['X-RateLimit-Remaining']) <= 10:
-					print("GitHub: X-RateLimit-Remaining is low, please try again later.")
-					return -1
-		except:
-			# print("Bad request response on commit:", commit['Sha'])
-			continue
-		
-	return update_list
+				if int(response.headers['X-RateLimit-Remaining']) <= RATE_LIMIT_THRESHOLD:
+					raise RateLimitReached()
+
+			# The cached response is still valid
+			if response.status_code == 304 and entry is not None:
+				cache.counts['Revalidated'] += 1
+				return entry['Body']
+
+			if response.status_code < 400:
+				body = response.json()
+				if cache and response.status_code == 200:
+					cache.put(key, body, response.headers.get('ETag'))
+				return body
+
+			# Retry server errors and rate limit responses, give up on any other error (e.g. 404)
+			rate_limited = response.status_code == 429 or (response.status_code == 403 and 'Retry-After' in response.headers)
+			if response.status_code < 500 and not rate_limited:
+				response.raise_for_status()
+			error = requests.HTTPError(f"{response.status_code} Error for url: {response.url}", response=response)
+			retry_after = response.headers.get('Retry-After')
+
+		if attempt < max_retries:
+			# Wait for the given time, or back off exponentially (with jitter)
+			delay = float(retry_after) if retry_after else backoff * 2 ** attempt + random.uniform(0, backoff)
+			time.sleep(delay)
+
+	raise error
 
 
-def download_files_history(files):
+def resolve_file_history(session, file, commit_cache, api_url=GITHUB_API):
 	"""
-	Takes a list of files as input and retrieves the commit content for the specific file using the GitHub API.
+	Finds the most recent commit of the file's history (default branch) in which the file has the blob SHA 
+	`ObjectSha`, and returns the file's entry of that commit (containing its patch).
 	
-	:param files: A list of dictionaries, where each dictionary represents a file object.
-	:returns: A list of dictionaries containing the updates to be made to the 'files' collection. 
-	Each dictionary contains the file's ID and history attribute. If the GitHub's API
-	remaining request number is low, return (-1)
+	:param session: The requests.Session used to perform the requests
+	:param file: A dictionary that represents a file object
+	:param commit_cache: A dictionary used to cache the files of the downloaded commits, by (repository, commit sha)
+	:param api_url: An (optional) string that represents the base URL of the API
+	:returns: The dictionary of the file in the commit's `files`, or None if it was not found.
+	"""
+
+	repo_name = file['RepoName']
+	file_path = file['FilePath']
+	repo_url = f"{api_url}/repos/{repo_name}"
+
+	# Get the commits of the file's history along with the file's blob SHA in each of them (one request)
+	owner, name = repo_name.split('/', 1)
+	variables = {'owner': owner, 'name': name, 'path': file_path, 'first': HISTORY_PAGE_SIZE}
+	try:
+		result = get_json(session, f"{api_url}/graphql", json={'query': FILE_HISTORY_QUERY, 'variables': variables})
+		nodes = result['data']['repository']['defaultBranchRef']['target']['history']['nodes']
+		# The commits having the file's blob, most recent first (the search stops at the first one whose payload lists the file)
+		candidates = [node['oid'] for node in nodes if (node.get('file') or {}).get('oid') == file['ObjectSha']]
+	except (KeyError, TypeError, requests.HTTPError):
+		# If GraphQL is not available, check every commit of the history (REST API)
+		candidates = [commit['sha'] for commit in get_json(session, f"{repo_url}/commits", params={'path': file_path})]
+
+	for commit_sha in candidates:
+		# Make a GET request to get the commit (if it was not downloaded for another file)
+		key = (repo_name, commit_sha)
+		if key not in commit_cache:
+			commit_cache[key] = get_json(session, f"{repo_url}/commits/{commit_sha}").get('files', [])
+
+		# Check if the file's SHA is in the specific commit
+		for committed_file in commit_cache[key]:
+			if committed_file['sha'] == file['ObjectSha']:
+				return committed_file
+
+	return None
+
+
+class RateLimiter:
 	"""
+	Class for pacing concurrent requests according to GitHub's rate limit headers. When the remaining
+	number of requests drops to the threshold, every request waits until the rate limit window resets.
+	"""
+
+	def __init__(self, threshold=RATE_LIMIT_THRESHOLD):
+		self.threshold = threshold
+		self.remaining = None
+		self.reset = 0
+		self.lock = asyncio.Lock()
+
+	def update(self, headers):
+		# Keep the most recent rate limit information received
+		if 'X-RateLimit-Remaining' in headers:
+			self.remaining = int(headers['X-RateLimit-Remaining'])
+		if 'X-RateLimit-Reset' in headers:
+			self.reset = int(headers['X-RateLimit-Reset'])
+
+	async def wait(self):
+		# Only one request sleeps at a time, the rest wait for the lock to be released
+		async with self.lock:
+			if self.remaining is not None and self.remaining <= self.threshold:
+				delay = self.reset - time.time() + 1
+				if delay > 0:
+					print(f"GitHub: X-RateLimit-Remaining is low, waiting {int(delay)}s for the rate limit to reset.")
+					await asyncio.sleep(delay)
+				self.remaining = None
+
+
+async def fetch_json(session, url, limiter, max_retries=5, backoff=1.0, cache=None):
+	"""
+	Performs a GET request to the GitHub API and returns the decoded JSON response. Server errors and
+	(secondary) rate limit responses are retried with exponential backoff, honoring the `Retry-After` header.
+	If a response cache is used, it is handled the same way as in `get_json`.
 	
-	# Define a list to store dictionaries with the commit's ID and content attribute
-	update_list = []
+	:param session: The aiohttp.ClientSession used to perform the request
+	:param url: A string that represents the URL of the request
+	:param limiter: The RateLimiter object shared by all the requests
+	:param max_retries: An (optional) integer specifying the maximum number of retries of a request
+	:param backoff: An (optional) float specifying the initial delay between retries, in seconds
+	:param cache: An (optional) ResponseCache object. Defaults to the cache configured in the environment.
+	:returns: The decoded JSON response. Raises RequestFailed if the request did not succeed.
+	"""
+
+	cache = cache or response_cache
+	headers = {}
+	entry = None
+
+	if cache:
+		key = cache.key(url)
+		entry = cache.get(key)
+		if cache.offline or (entry is not None and cache.is_immutable(url)):
+			if entry is None:
+				raise RequestFailed(url)
+			return entry['Body']
+		if entry is not None and entry['ETag']:
+			headers['If-None-Match'] = entry['ETag']
+
+	status = None
+	for attempt in range(max_retries + 1):
+		await limiter.wait()
+		try:
+			async with session.get(url, headers=headers) as response:
+				limiter.update(response.headers)
+				status = response.status
+				if response.status == 200:
+					body = await response.json(content_type=None)
+					if cache:
+						cache.put(key, body, response.headers.get('ETag'))
+					return body
+
+				# The cached response is still valid
+				if response.status == 304 and entry is not None:
+					cache.counts['Revalidated'] += 1
+					return entry['Body']
+
+				# Retry server errors and rate limit responses, give up on any other error (e.g. 404)
+				rate_limited = response.status == 429 or (response.status == 403 and (
+					'Retry-After' in response.headers or response.headers.get('X-RateLimit-Remaining') == '0'))
+				if response.status < 500 and not rate_limited:
+					raise RequestFailed(url, response.status)
+
+				retry_after = response.headers.get('Retry-After')
+		except (aiohttp.ClientError, asyncio.TimeoutError):
+			status, retry_after = None, None
+
+		if attempt < max_retries:
+			# Wait for the given time, or back off exponentially (with jitter)
+			delay = float(retry_after) if retry_after else backoff * 2 ** attempt + random.uniform(0, backoff)
+			await asyncio.sleep(delay)
+
+	raise RequestFailed(url, status)
+
+
+async def download_commits_content_async(commits, concurrency=8, api_url=GITHUB_API, on_result=None):
+	"""
+	Takes a list of commits as input and retrieves the content of each commit using the GitHub API, 
+	performing up to `concurrency` requests at a time over a shared connection pool. Instead of aborting 
+	when the rate limit is low, the requests are paused until the rate limit resets.
+	Commits that no longer exist (404) are marked as resolved, so that a resumed download skips them. 
+	Commits whose requests fail are reported and left to be retried by the next run.
+	
+	:param commits: A list of dictionaries, where each dictionary represents a commit object.
+	:param concurrency: An (optional) integer specifying the maximum number of concurrent requests.
+	:param api_url: An (optional) string that represents the base URL of the API (e.g. a local server for testing).
+	:param on_result: An (optional) function called with each update as soon as it is downloaded 
+	(e.g. to persist it, so that an interrupted download can be resumed).
+	:returns: A list of dictionaries containing the updates to be made to the 'commits' collection, in the order 
+	of the given commits. Each dictionary contains the commit's ID, the `ContentResolved` flag and (if the commit 
+	exists) the content attribute.
+	"""
 
 	# Use GitHub token to achieve better maximum API call rate
 	headers = {'Authorization': f'token {githubapikey}'}
 
-	for file in files:
+	limiter = RateLimiter()
+	completed = 0
+	failed = 0
+	semaphore = asyncio.Semaphore(concurrency)
+	connector = aiohttp.TCPConnector(limit=concurrency)
 
-		update_dict = {}
-		# Get commit's ID and store it to dictionary
-		update_dict['_id'] = file['_id']
+	async with aiohttp.ClientSession(headers=headers, connector=connector) as session:
 
-		# Retrieve the required information for the file
-		repo_name = file['RepoName']
-		file_path = file['FilePath']
+		async def download(commit):
+			nonlocal completed, failed
+			apiurl = f"{api_url}/repos/{commit['RepoName']}/commits/{commit['Sha']}"
+			missing = False
+			try:
+				async with semaphore:
+					content = await fetch_json(session, apiurl, limiter)
+			except RequestFailed as error:
+				content = None
+				# A commit (or repository) that no longer exists is resolved without content, the rest are retried by the next run
+				missing = error.status == 404
+				if not missing:
+					print(f"Could not download the content of commit {commit['Sha']} ({commit['RepoName']}): {error}")
+					failed += 1
 
-		repo_url = f"https://api.github.com/repos/{repo_name}"
-		commit_history_url = f"{repo_url}/commits?path={file_path}"
-		
-		try:
-			# Make a GET request to fetch the commit history for the file
-			response = requests.get(commit_history_url, headers=headers)
+			completed += 1
+			report_progress(completed, len(commits), 'commits')
+			if content is None and not missing:
+				return None
 
-			# Check GitHub's API call rate limit
-			if 'X-RateLimit-Remaining' in response.headers:
-				if int(response.headers['X-RateLimit-Remaining']) <= 10:
-					print("GitHub: X-RateLimit-Remaining is low, please try again later.")
-					return -1
-
-			commits = response.json()
-
-			for commit in commits:
-				commit_sha = commit['sha']
-
-				# Make a GET request to get the tree for the commit
-				commit_url = f"{repo_url}/commits/{commit_sha}"
-				commit_response = requests.get(commit_url, headers=headers)
-
-				# Check GitHub's API call rate limit
-				if 'X-RateLimit-Remaining' in commit_response.headers:
-					if int(commit_response.headers['X-RateLimit-Remaining']) <= 10:
-						print("GitHub: X-RateLimit-Remaining is low, please try again later.")
-						return -1
-				
-				commit_data = commit_response.json()
-
-				# Check if the file's SHA is in the specific commit
-				for commited_file in commit_data['files']:
-					if commited_file['sha'] == file['ObjectSha']:
-						update_dict['FileHistory'] = commited_file
-						# Add update dictionary to update list
-						update_list.append(update_dict)
-						break # exit nested loop
-
-				# If history found, exit search loop
-				if update_dict['FileHistory']:
-					break
-
-		except:
-			continue
+			# Mark the commit as resolved, even if it does not exist
+			update_dict = {'_id': commit['_id'], 'ContentResolved': True}
+			if content is not None:
+				update_dict['CommitContent'] = content
+			if on_result:
+				on_result(update_dict)
+			return update_dict
 
-	return update_list
-	
\ No newline at end of file
+		results = await asyncio.gather(*(download(commit) for commit in commits))
+
+	if failed:
+		print(f"The content of {failed} commits could not be downloaded, run again to retry them")
+	return [update for update in results if update is not None]
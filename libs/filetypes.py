@@ -0,0 +1,94 @@
+import os
+import re
+import fnmatch
+import functools
+import importlib
+from pygments.lexers._mapping import LEXERS
+from pygments.plugin import find_plugin_lexers
+
+# Glob patterns of the form '*.ext', which match by the suffix of the file name only
+SUFFIX_PATTERN = re.compile(r'\*(\.[^*?\[\]]+)')
+GLOB_CHARS = re.compile(r'[*?\[\]]')
+
+
+class LexerIndex:
+	"""
+	Class for identifying the Pygments lexer of a file name, with the same result as Pygments' `get_lexer_for_filename`,
+	but without matching the file name against every glob pattern of every lexer on each call. The filename patterns
+	of all the lexers (built-in and plugins) are indexed once: '*.ext' patterns by their suffix, and exact names by the name.
+	The few remaining patterns (e.g. '*.[1-9]') are matched one by one. Lexer classes are imported only when needed to
+	break ties between several matching lexers, and the results are memoized per file name.
+	"""
+
+	def __init__(self):
+		# Pattern -> list of (lexer entry, pattern), where an entry is (class name, module name or lexer class, lexer name, first pattern)
+		self.by_suffix = {}
+		self.by_name = {}
+		self.other_patterns = []
+
+		for class_name, (module_name, name, _, filenames, _) in LEXERS.items():
+			for pattern in filenames:
+				self._add((class_name, module_name, name, filenames[0]), pattern)
+		for lexer_class in find_plugin_lexers():
+			for pattern in lexer_class.filenames:
+				self._add((lexer_class.__name__, lexer_class, lexer_class.name, lexer_class.filenames[0]), pattern)
+
+	def _add(self, entry, pattern):
+		match = SUFFIX_PATTERN.fullmatch(pattern)
+		if match:
+			self.by_suffix.setdefault(match.group(1), []).append((entry, pattern))
+		elif not GLOB_CHARS.search(pattern):
+			self.by_name.setdefault(pattern, []).append((entry, pattern))
+		else:
+			self.other_patterns.append((entry, pattern, re.compile(fnmatch.translate(pattern))))
+
+	@functools.lru_cache(maxsize=65536)
+	def lookup(self, filename):
+		"""
+		Returns the lexer of a file name as a tuple (lexer name, first filename pattern of the lexer, e.g. '*.js'),
+		or None if no lexer matches it.
+		"""
+
+		name = os.path.basename(filename)
+
+		# Collect the matching patterns: every suffix starting at a dot, the exact name and the remaining patterns
+		matches = list(self.by_name.get(name, []))
+		position = name.find('.')
+		while position != -1:
+			matches.extend(self.by_suffix.get(name[position:], []))
+			position = name.find('.', position + 1)
+		matches.extend((entry, pattern) for entry, pattern, regex in self.other_patterns if regex.match(name))
+
+		if not matches:
+			return None
+
+		# Choose the lexer like Pygments: highest priority (explicit names get a bonus), then highest class name
+		def rating(match):
+			(class_name, module, _, _), pattern = match
+			bonus = 0.5 if '*' not in pattern else 0
+			return load_lexer_class(class_name, module).priority + bonus, class_name
+
+		(_, _, lexer_name, first_pattern), _ = max(matches, key=rating) if len(matches) > 1 else matches[0]
+		return lexer_name, first_pattern
+
+	def lookup_many(self, filenames):
+		"""
+		Returns the result of `lookup` for each of the file names (e.g. of the files of a commit).
+		"""
+
+		return [self.lookup(filename) for filename in filenames]
+
+
+@functools.lru_cache(maxsize=None)
+def load_lexer_class(class_name, module):
+	"""
+	Returns a lexer class, importing its module if needed (plugin lexers are given as classes).
+	"""
+
+	if isinstance(module, str):
+		return getattr(importlib.import_module(module), class_name)
+	return module
+
+
+# Index of the lexers (built once per process)
+lexer_index = LexerIndex()
@@ -0,0 +1,48 @@
+import os
+import shutil
+import hashlib
+
+""" Fingerprints of the inputs of the pipeline (files, directories, external tools), used to detect whether they changed
+	(e.g. to skip the stages that are up to date, or to invalidate the cached analysis results).
+"""
+
+
+def file_fingerprint(path):
+	"""
+	Returns the SHA-256 of the content of a file, or a fingerprint of the files of a directory (None if it does not exist).
+	The files of a directory (e.g. the dataset snapshot) are identified by their path, size and modification time, 
+	like the tools, so that checking whether a stage is up to date does not read all of their content.
+	"""
+
+	if not path or not os.path.exists(path):
+		return None
+
+	digest = hashlib.sha256()
+	if os.path.isdir(path):
+		paths = sorted(os.path.join(root, filename) for root, _, filenames in os.walk(path) for filename in filenames)
+		for file_path in paths:
+			stat = os.stat(file_path)
+			digest.update(f"{os.path.relpath(file_path, path)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode('utf-8'))
+		return digest.hexdigest()
+
+	with open(path, 'rb') as infile:
+		for chunk in iter(lambda: infile.read(1 << 20), b''):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+
+def tool_fingerprint(path):
+	"""
+	Returns a fingerprint of the version of an external tool (its path, size and modification time), or None
+	if it does not exist. Commands found on the PATH (e.g. 'pmd') are resolved to their file.
+	"""
+
+	if not path:
+		return None
+	path = path.strip('"\'')
+	if not os.path.exists(path):
+		path = shutil.which(path)
+		if not path:
+			return None
+	stat = os.stat(path)
+	return f"{os.path.realpath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
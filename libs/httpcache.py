@@ -0,0 +1,104 @@
+import os
+import re
+import gzip
+import json
+import hashlib
+
+# URLs whose responses never change (commits identified by their full SHA)
+IMMUTABLE_URL = re.compile(r'/commits/[0-9a-f]{40}$')
+
+
+class CacheMiss(Exception):
+	"""
+	Raised in offline mode, when a response is not found in the cache.
+	"""
+
+
+class ResponseCache:
+	"""
+	Class for maintaining a content-addressed, on-disk cache of HTTP (JSON) responses. 
+	Each response is stored gzip-compressed in a file named after the SHA-256 of its request, along with
+	its ETag, so that it can be revalidated with a conditional request. When the total size of the cache 
+	exceeds `max_bytes`, the least recently used responses are evicted. In offline mode, responses are 
+	served only from the cache.
+	"""
+
+	def __init__(self, directory, max_bytes=512 * 1024 * 1024, offline=False):
+		self.directory = directory
+		self.max_bytes = max_bytes
+		self.offline = offline
+		self.counts = {'Hits': 0, 'Misses': 0, 'Revalidated': 0, 'Evicted': 0}
+		os.makedirs(directory, exist_ok=True)
+
+		# Calculate the current size of the cache
+		self.size = sum(os.path.getsize(path) for path in self._entries())
+
+	def key(self, url, params=None, body=None):
+		"""
+		Returns the key of a request, i.e. the SHA-256 of its URL, query parameters and body.
+		"""
+		request = json.dumps([url, params, body], sort_keys=True)
+		return hashlib.sha256(request.encode('utf-8')).hexdigest()
+
+	def is_immutable(self, url):
+		"""
+		Returns True if the response of the URL never changes, so it can be served without revalidation.
+		"""
+		return bool(IMMUTABLE_URL.search(url))
+
+	def get(self, key):
+		"""
+		Returns the stored entry of the key (a dictionary with 'ETag' and 'Body'), or None if it is not cached.
+		"""
+		path = self._path(key)
+		try:
+			with gzip.open(path, 'rt', encoding='utf-8') as infile:
+				entry = json.load(infile)
+		except (OSError, ValueError):
+			self.counts['Misses'] += 1
+			return None
+
+		# Mark the entry as recently used
+		os.utime(path)
+		self.counts['Hits'] += 1
+		return entry
+
+	def put(self, key, body, etag=None):
+		"""
+		Stores the (decoded JSON) body of a response and its ETag, evicting old entries if needed.
+		"""
+		path = self._path(key)
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+
+		previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+
+		# Write to a temporary file first, so that an interrupted write does not leave a corrupted entry
+		temp_path = path + '.tmp'
+		with gzip.open(temp_path, 'wt', encoding='utf-8') as outfile:
+			json.dump({'ETag': etag, 'Body': body}, outfile)
+		os.replace(temp_path, path)
+
+		self.size += os.path.getsize(path) - previous_size
+		if self.size > self.max_bytes:
+			self.evict()
+
+	def evict(self):
+		"""
+		Deletes the least recently used entries, until the cache is reduced to 90% of its maximum size.
+		"""
+		entries = sorted(self._entries(), key=os.path.getmtime)
+		for path in entries:
+			if self.size <= self.max_bytes * 0.9:
+				break
+			self.size -= os.path.getsize(path)
+			os.remove(path)
+			self.counts['Evicted'] += 1
+
+	def _path(self, key):
+		return os.path.join(self.directory, key[:2], key + '.json.gz')
+
+	def _entries(self):
+		for root, _, filenames in os.walk(self.directory):
+			for filename in filenames:
+				if filename.endswith('.json.gz'):
+					yield os.path.join(root, filename)
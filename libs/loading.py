@@ -0,0 +1,143 @@
+import csv
+import codecs
+from multiprocessing.util import Finalize
+from concurrent.futures import ProcessPoolExecutor
+from libs.dbmanager import DBManager
+from libs.utils import iter_json_array
+
+# Maximum number of documents inserted to the database at once
+BATCH_SIZE = 500
+
+# Database connection of a loading worker process (created once per process)
+_worker_dbmanager = None
+
+
+def load_sources(dbmanager, collection_name, file_path, batch_size=BATCH_SIZE):
+	"""
+	This function loads the sources of a DevGPT snapshot file, calculates their statistics, and saves 
+	them in a Mongo database. The sources are parsed incrementally and inserted in bounded batches,
+	so the memory used does not depend on the size of the snapshot file.
+	
+	:param dbmanager: The DBManager object used to store the sources
+	:param collection_name: A string that represents the name of the collection being processed
+	:param file_path: A string that represents the path of the file to be loaded
+	:param batch_size: An (optional) integer specifying the maximum number of sources inserted at once
+	:returns: A dictionary containing the number of Sources, SharedLinks, Prompts and CodeBlocks found in the file.
+	"""
+
+	db_collection_name = collection_name.replace(" ", "_").lower()
+
+	# Initialize the counters (calculated in a single pass over the sources)
+	counters = {'Sources': 0, 'SharedLinks': 0, 'Prompts': 0, 'CodeBlocks': 0}
+	batch = []
+
+	with codecs.open(file_path, 'r', 'utf-8') as infile:
+		for i, source in enumerate(iter_json_array(infile, 'Sources'), start=1):
+			counters['Sources'] += 1
+			counters['SharedLinks'] += len(source['ChatgptSharing'])
+			for sharing in source['ChatgptSharing']:
+				conversations = sharing.get('Conversations', [])
+				counters['Prompts'] += len(conversations)
+				counters['CodeBlocks'] += sum(len(conv['ListOfCode']) for conv in conversations)
+
+			# Add a NumericID attribute to the data
+			source['NumericID'] = i
+			batch.append(source)
+
+			# Flush the batch to the database when it is full
+			if len(batch) >= batch_size:
+				dbmanager.add_data(db_collection_name, batch)
+				batch = []
+
+	# Add the remaining sources
+	if batch:
+		dbmanager.add_data(db_collection_name, batch)
+
+	return counters
+
+
+def load_links(dbmanager, file_path, batch_size=BATCH_SIZE):
+	"""
+	This function loads the link sharing CSV file of a DevGPT snapshot and saves it in a Mongo database,
+	in bounded batches.
+	
+	:param dbmanager: The DBManager object used to store the links
+	:param file_path: A string that represents the path of the CSV file to be loaded
+	:param batch_size: An (optional) integer specifying the maximum number of links inserted at once
+	:returns: A dictionary containing the Number of links found in the file.
+	"""
+
+	counters = {'Number': 0}
+	batch = []
+
+	with codecs.open(file_path, 'r', 'utf-8') as infile:
+		for link in csv.DictReader(infile):
+			counters['Number'] += 1
+			batch.append(link)
+			if len(batch) >= batch_size:
+				dbmanager.add_data("links", batch)
+				batch = []
+
+	if batch:
+		dbmanager.add_data("links", batch)
+
+	return counters
+
+
+def load_collection(dbmanager, collection_name, file_path):
+	"""
+	Loads a single snapshot file to its collection, using the appropriate loader for its structure
+	(the 'Links' collection is a CSV file, every other collection is a JSON file).
+	
+	:param dbmanager: The DBManager object used to store the data
+	:param collection_name: A string that represents the name of the collection being processed
+	:param file_path: A string that represents the path of the file to be loaded
+	:returns: A dictionary containing the statistics of the loaded collection.
+	"""
+
+	print(f"Loading {collection_name}")
+
+	if collection_name == 'Links':
+		return load_links(dbmanager, file_path)
+	return load_sources(dbmanager, collection_name, file_path)
+
+
+def _init_worker(dbpath):
+	"""
+	Initializer of the loading worker processes. Each worker opens its own MongoClient connection,
+	since connections cannot be shared between processes, and closes it when the pool shuts down.
+	"""
+
+	global _worker_dbmanager
+	_worker_dbmanager = DBManager(dbpath)
+	# Worker processes do not run the atexit handlers, so close the connection with a finalizer
+	Finalize(_worker_dbmanager, _worker_dbmanager.close, exitpriority=10)
+
+
+def _load_collection_worker(collection_name, file_path):
+	"""
+	Loads a collection using the database connection of the current worker process.
+	"""
+
+	return load_collection(_worker_dbmanager, collection_name, file_path)
+
+
+def load_collections_parallel(dbpath, files, max_workers):
+	"""
+	Loads several snapshot files concurrently, using a pool of worker processes. Every file is parsed
+	and inserted by a single worker (with its own database connection), so the JSON decoding and BSON
+	encoding of the independent collections run on different cores.
+	
+	:param dbpath: A string that represents the connection string of the MongoDB database
+	:param files: A dictionary mapping each collection name to the path of its file
+	:param max_workers: An integer specifying the maximum number of worker processes
+	:returns: A dictionary mapping each collection name to its statistics, in the same order as `files`.
+	"""
+
+	with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(dbpath,)) as executor:
+		futures = {
+			collection_name: executor.submit(_load_collection_worker, collection_name, file_path)
+			for collection_name, file_path in files.items()
+		}
+		# Collect the results in the order of the input, independently of completion order
+		return {collection_name: future.result() for collection_name, future in futures.items()}
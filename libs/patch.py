@@ -0,0 +1,87 @@
+import re
+import functools
+
+# Hunk header of a unified diff, e.g. '@@ -12,7 +12,9 @@ function name()'
+HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+
+class ParsedPatch:
+	"""
+	Class holding both versions of a file, as reconstructed from a GitHub patch (unified diff), and the mapping of their
+	lines to the lines of the real files. A patch only contains the hunks of the diff, so the line `i` of a reconstructed
+	version is the line `line_numbers[version][i - 1]` of the real file.
+	"""
+
+	def __init__(self, current_lines, previous_lines, current_numbers, previous_numbers, hunks):
+		self.lines = {'current': current_lines, 'previous': previous_lines}
+		self.line_numbers = {'current': current_numbers, 'previous': previous_numbers}
+		# Hunk headers as tuples (previous start, previous length, current start, current length)
+		self.hunks = hunks
+
+	def content(self, version):
+		"""
+		Returns the content of a version of the file ('current' or 'previous').
+		"""
+		return '\n'.join(self.lines[version])
+
+	def file_line(self, version, line):
+		"""
+		Returns the line number in the real file of a (1-based) line of the reconstructed version.
+		"""
+		return self.line_numbers[version][line - 1]
+
+
+@functools.lru_cache(maxsize=256)
+def parse_patch(patch):
+	"""
+	This function parses a GitHub patch (unified diff) in a single pass, reconstructing both the current and the
+	previous version of the file, and mapping each of their lines to its line number in the real file (using the hunk headers).
+	Empty lines are handled as empty context lines, and '\\ No newline at end of file' markers are skipped.
+	The results are memoized per patch, since the same patch is parsed by several analysis steps.
+
+	:param patch: A string that represents the patch of a GitHub's commit for a file
+	:returns: A ParsedPatch object.
+	"""
+
+	current_lines, previous_lines = [], []
+	current_numbers, previous_numbers = [], []
+	hunks = []
+
+	# Line numbers of the next line of each version (patches without hunk headers start from the first line)
+	current_number = previous_number = 1
+
+	for line in (patch or '').splitlines():
+		marker = line[:1]
+
+		if marker == '@':
+			match = HUNK_HEADER.match(line)
+			if match:
+				previous_start, previous_length, current_start, current_length = match.groups()
+				previous_number, current_number = int(previous_start), int(current_start)
+				hunks.append((previous_number, int(previous_length or 1), current_number, int(current_length or 1)))
+			continue
+
+		if marker == '\\':
+			continue
+
+		if marker == '+':
+			current_lines.append(line[1:])
+			current_numbers.append(current_number)
+			current_number += 1
+
+		elif marker == '-':
+			previous_lines.append(line[1:])
+			previous_numbers.append(previous_number)
+			previous_number += 1
+
+		else:
+			# Context line (belongs to both versions)
+			content = line[1:] if marker == ' ' else line
+			current_lines.append(content)
+			current_numbers.append(current_number)
+			current_number += 1
+			previous_lines.append(content)
+			previous_numbers.append(previous_number)
+			previous_number += 1
+
+	return ParsedPatch(current_lines, previous_lines, current_numbers, previous_numbers, hunks)
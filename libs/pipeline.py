@@ -0,0 +1,179 @@
+import os
+import ast
+import sys
+import json
+import time
+import uuid
+import hashlib
+import subprocess
+from libs.fingerprint import file_fingerprint, tool_fingerprint
+
+""" Stage runner of the pipeline: every stage declares the stages it depends on and its inputs (files, tools, 
+	DB collections). A stage is executed only if the fingerprint of its inputs, or any of the stages it depends on,
+	changed since its last successful execution.
+"""
+
+# Python interpreter used to execute the stages
+PYTHON = sys.executable or "python"
+
+
+class Stage:
+	"""
+	Class describing a stage of the pipeline.
+	
+	:param name: A string that represents the name of the stage
+	:param command: A list containing the command executed by the stage (e.g. ["python", "analyzedata.py"])
+	:param deps: A list of the names of the stages that must be executed before this stage
+	:param files: A list of paths of files (or directories) whose content is an input of the stage (scripts, annotations, rulesets)
+	:param tools: A list of paths of external tools used by the stage. A tool's version is identified by its size and modification time
+	:param collections: A list of names of the DB collections read (but not modified) by the stage
+	"""
+
+	def __init__(self, name, command, deps=(), files=(), tools=(), collections=()):
+		self.name = name
+		self.command = command
+		self.deps = list(deps)
+		self.files = list(files)
+		self.tools = list(tools)
+		self.collections = list(collections)
+
+
+def python_imports(path, root='.'):
+	"""
+	Returns the paths of the modules of the repository imported (directly or indirectly) by a Python file, 
+	e.g. to check that the files of a stage include every module it uses.
+	"""
+
+	imported = set()
+	pending = [path]
+	while pending:
+		file_path = pending.pop()
+		with open(file_path, 'r', encoding='utf-8') as infile:
+			tree = ast.parse(infile.read())
+		for node in ast.walk(tree):
+			if isinstance(node, ast.ImportFrom) and node.module and not node.level:
+				names = [node.module]
+			elif isinstance(node, ast.Import):
+				names = [alias.name for alias in node.names]
+			else:
+				continue
+			for name in names:
+				module_path = name.replace('.', '/') + '.py'
+				if module_path not in imported and os.path.exists(os.path.join(root, module_path)):
+					imported.add(module_path)
+					pending.append(os.path.join(root, module_path))
+	return imported
+
+
+class PipelineRunner:
+	"""
+	Class executing the stages of the pipeline in dependency order, skipping the stages whose inputs did not change.
+	The fingerprints, run IDs and execution times of the stages are stored in a JSON state file.
+	"""
+
+	def __init__(self, stages, state_path='.pipelinestate.json', dbmanager=None):
+		self.stages = {stage.name: stage for stage in stages}
+		self.state_path = state_path
+		self.dbmanager = dbmanager
+
+		if os.path.exists(state_path):
+			with open(state_path, 'r') as infile:
+				self.state = json.load(infile)
+		else:
+			self.state = {}
+
+	def order(self, targets=None):
+		"""
+		Returns the names of the stages to be considered in dependency order: the given targets and all the 
+		stages they depend on (or every stage if no target is given).
+		"""
+
+		ordered = []
+		visiting = set()
+
+		def visit(name):
+			if name in ordered:
+				return
+			if name not in self.stages:
+				raise ValueError(f"Unknown stage '{name}'")
+			if name in visiting:
+				raise ValueError(f"Cyclic dependency on stage '{name}'")
+			visiting.add(name)
+			for dep in self.stages[name].deps:
+				visit(dep)
+			visiting.discard(name)
+			ordered.append(name)
+
+		for name in targets or self.stages:
+			visit(name)
+		return ordered
+
+	def fingerprint(self, stage):
+		"""
+		Calculates the fingerprint of a stage's inputs: its command, files, tools, collections, and the run IDs of
+		the stages it depends on (so that a stage is executed again when any of its dependencies was executed).
+		"""
+
+		inputs = {
+			'Command': stage.command,
+			'Files': {path: file_fingerprint(path) for path in stage.files if path},
+			'Tools': {path: tool_fingerprint(path) for path in stage.tools if path},
+			'Collections': {name: self.dbmanager.collection_hash(name) for name in stage.collections} if self.dbmanager else {},
+			'Deps': {dep: self.state.get(dep, {}).get('RunId') for dep in stage.deps}
+		}
+		return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode('utf-8')).hexdigest()
+
+	def run(self, targets=None, force=False):
+		"""
+		Executes the given stages (and the stages they depend on) that are out of date.
+		
+		:param targets: An (optional) list of stage names. Defaults to all the stages
+		:param force: An (optional) boolean. If set, the stages are executed even if their inputs did not change
+		:returns: Boolean. (True) if all the stages are up to date or were executed successfully, (False) otherwise.
+		"""
+
+		for name in self.order(targets):
+			stage = self.stages[name]
+			fingerprint = self.fingerprint(stage)
+			previous = self.state.get(name, {})
+
+			if not force and previous.get('Fingerprint') == fingerprint:
+				print(f"[{name}] Up to date, skipping")
+				continue
+
+			print(f"[{name}] Running: {' '.join(stage.command)}")
+			start = time.time()
+			result = subprocess.run(stage.command)
+			duration = round(time.time() - start, 2)
+
+			if result.returncode != 0:
+				print(f"[{name}] Failed after {duration}s (exit code {result.returncode})")
+				return False
+
+			# Record the successful execution (a new run ID makes the dependent stages out of date)
+			self.state[name] = {
+				'Fingerprint': fingerprint,
+				'RunId': uuid.uuid4().hex,
+				'Duration': duration,
+				'LastRun': time.strftime('%Y-%m-%d %H:%M:%S')
+			}
+			self.save()
+			print(f"[{name}] Finished in {duration}s")
+
+		return True
+
+	def save(self):
+		with open(self.state_path, 'w') as outfile:
+			json.dump(self.state, outfile, indent=3)
+
+	def report(self):
+		"""
+		Prints the duration of the last execution of every stage.
+		"""
+
+		for name in self.order():
+			stage_state = self.state.get(name)
+			if stage_state:
+				print(f"{name}: {stage_state['Duration']}s (last run {stage_state['LastRun']})")
+			else:
+				print(f"{name}: never executed")
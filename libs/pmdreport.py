@@ -0,0 +1,89 @@
+import json
+import xml.etree.ElementTree as ElementTree
+from collections import namedtuple
+
+# A quality violation reported by PMD
+Violation = namedtuple('Violation', ['file', 'rule', 'category', 'line', 'priority', 'description'])
+
+
+def category_name(ruleset):
+	"""
+	Returns the category of a violation from the name of its PMD ruleset, e.g. 'Best Practices' -> 'BestPractices'.
+	"""
+
+	return ''.join(ruleset.split())
+
+
+def parse_json_report(report):
+	"""
+	This function parses a PMD report in JSON format (`-f json`).
+
+	:param report: A string containing the report
+	:returns: A tuple containing the list of `Violation` records (in the order of the report), and the list of the names 
+	of the files PMD failed to process (its `processingErrors`, e.g. files that could not be parsed).
+	:raises ValueError: If the report is not valid JSON.
+	"""
+
+	if not report.strip():
+		return [], []
+
+	report = json.loads(report)
+	violations = []
+	for file in report.get('files', []):
+		for violation in file.get('violations', []):
+			violations.append(Violation(
+				file['filename'],
+				violation['rule'],
+				category_name(violation.get('ruleset', '')),
+				int(violation.get('beginline', 0)),
+				int(violation.get('priority', 0)),
+				violation.get('description', '').strip()
+			))
+	processing_errors = [error['filename'] for error in report.get('processingErrors', [])]
+	return violations, processing_errors
+
+
+def parse_xml_report(report):
+	"""
+	This function parses a PMD report in XML format (`-f xml`).
+
+	:param report: A string containing the report
+	:returns: A list of `Violation` records, in the order of the report.
+	:raises ValueError: If the report is not valid XML.
+	"""
+
+	if not report.strip():
+		return []
+
+	try:
+		root = ElementTree.fromstring(report)
+	except ElementTree.ParseError as error:
+		raise ValueError(f"Invalid PMD XML report: {error}")
+
+	violations = []
+	for file in root:
+		# Ignore the namespace of the tags
+		if file.tag.rsplit('}', 1)[-1] != 'file':
+			continue
+		for violation in file:
+			if violation.tag.rsplit('}', 1)[-1] != 'violation':
+				continue
+			violations.append(Violation(
+				file.get('name'),
+				violation.get('rule'),
+				category_name(violation.get('ruleset', '')),
+				int(violation.get('beginline', 0)),
+				int(violation.get('priority', 0)),
+				(violation.text or '').strip()
+			))
+	return violations
+
+
+def parse_report(report, report_format='json'):
+	"""
+	Parses a PMD report in JSON or XML format into a list of `Violation` records.
+	"""
+
+	if report_format == 'xml':
+		return parse_xml_report(report)
+	return parse_json_report(report)[0]
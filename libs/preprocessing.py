@@ -1,19 +1,21 @@
 import regex as re
 from collections import Counter
-from pygments.lexers import get_lexer_for_filename
-from pygments.util import ClassNotFound
+from concurrent.futures import ProcessPoolExecutor
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+from libs.filetypes import lexer_index
 
-def contains_invalid_chars(text):
+class TextValidator:
 	"""
-	Checks if a given text contains any invalid Unicode character.
-	
-	:param text: The string to check for invalid characters.
-	:returns: Boolean. (True) if the input text contains any invalid characters, and (False) otherwise.
+	Class for checking whether texts contain invalid Unicode characters. The regular expressions are compiled
+	once, and the validity of every distinct character is calculated once and kept in a table, so each text
+	is classified with a single scan.
 	"""
-	
+
+	# Characters to be checked (ASCII characters are always valid)
 	all_unicode_patterns = re.compile(r'[\u0080-\uffef]', re.UNICODE)  # @UndefinedVariable
 
-	valid_patterns = [
+	valid_patterns = re.compile('|'.join([
 		r'[\u0080-\u00FF]', # "Latin-1 Supplement" category
 		r'[\u2500-\u257F\u200b\u23a6\u23a4\u23a3\u23a1]', # Box drawing characters
 		r'[\u2600-\u26FF\u2B50\ufe0f]', # Miscellaneous Symbols
@@ -23,19 +25,59 @@ def contains_invalid_chars(text):
 		r'[\u0391-\u03A9\u03B1-\u03C9]', # Greek letters used in math
 		r'[\p{P}\p{S}\p{So}]', # "Punctuation Dash" and Symbol characters
 		r'[\p{Block=Emoticons}]', # Emoticons Block characters
-	]
+	]))
+
+	def __init__(self):
+		# Table of the characters checked so far, and whether they are valid
+		self.validity = {}
 
-	valid_patterns = '|'.join(valid_patterns)
-	valid_patterns = re.compile(valid_patterns)
+	def contains_invalid(self, text):
+		"""
+		Checks if a given text contains any invalid Unicode character.
+		
+		:param text: The string to check for invalid characters.
+		:returns: Boolean. (True) if the input text contains any invalid characters, and (False) otherwise.
+		"""
+
+		# Most texts are plain ASCII
+		if text.isascii():
+			return False
+
+		for character in set(self.all_unicode_patterns.findall(text)):
+			valid = self.validity.get(character)
+			if valid is None:
+				valid = self.validity[character] = bool(self.valid_patterns.search(character))
+			# If at least one non-valid unicode found, return True
+			if not valid:
+				return True
+
+		return False
+
+	def any_invalid(self, texts):
+		"""
+		Checks if any of the given texts (e.g. all prompts and answers of a source) contains an invalid 
+		Unicode character, scanning them at once.
+		
+		:param texts: An iterable of strings to check for invalid characters.
+		:returns: Boolean. (True) if any of the texts contains invalid characters, and (False) otherwise.
+		"""
 
-	all_unicode_characters = all_unicode_patterns.findall(text)
+		return self.contains_invalid('\n'.join(texts))
 
-	for character in all_unicode_characters:
-		# If at least one non-valid unicode found, return True
-		if not valid_patterns.search(character):
-			return True
 
-	return False
+# Validator shared by all the checks of the module
+text_validator = TextValidator()
+
+
+def contains_invalid_chars(text):
+	"""
+	Checks if a given text contains any invalid Unicode character.
+	
+	:param text: The string to check for invalid characters.
+	:returns: Boolean. (True) if the input text contains any invalid characters, and (False) otherwise.
+	"""
+	
+	return text_validator.contains_invalid(text)
 
 
 def detect_invalid_sources(data):
@@ -60,73 +102,138 @@ def detect_invalid_sources(data):
 
 	# Check if every source is valid or not
 	for source in data:
+		source_invalid, source_invalid_links = check_source(source, source_type)
+		invalid_sources.extend(source_invalid)
+		invalid_links.extend(source_invalid_links)
 
-		# For different data types (commits, files), different text fields are checked.
-		if source_type == "commits":
-			# Check if entry's message contains non utf-8 characters
-			if contains_invalid_chars(source['Message']):
-					# print("Non-utf in commit message", source['URL']) # debugging
-					invalid_sources.append(source['NumericID'])
-					sharing_urls = [sharing['URL'] for sharing in source['ChatgptSharing']]
-					invalid_links.extend(sharing_urls)
-					continue
-
-		elif source_type == "files":
-			# Check if entry's commit message contains non utf-8 characters
-			if contains_invalid_chars(source['CommitMessage']):
-					# print("Non-utf in commit message", source['URL']) # debugging
-					invalid_sources.append(source['NumericID'])
-					sharing_urls = [sharing['URL'] for sharing in source['ChatgptSharing']]
-					invalid_links.extend(sharing_urls)
-					continue
-
-		source_contains_code = False # Variable to check if source contains code blocks
-
-		contains_active_link = False # Variable to store whether reference contains at least one active link
-
-		# Ckeck each Chatgpt shared link
-		for sharing in source['ChatgptSharing']:
-			# Check status code of the Chatgpt shared link, and keep only success (200)
-			if sharing['Status'] != 200:
-					invalid_links.append(sharing['URL'])
-					continue # continue to the next dialogue check
-			else:
-					contains_active_link = True
-
-			# For each conversation in the specific shared link, check if code block exists
-			link_contains_code = False
-			for conv in sharing['Conversations']:
-					if len(conv['ListOfCode']): # check if List of Code is not empty
-						link_contains_code = True # if code block found, no need to check the rest of the conversations, so exit loop
-						source_contains_code = True
-						break
-
-			# If no code blocks are detected in the link, add link to drop list
-			if not link_contains_code:
-				invalid_links.append(sharing['URL'])
+	return invalid_sources, invalid_links
+
+
+def check_source(source, source_type):
+	"""
+	Checks whether a single source is valid (see `detect_invalid_sources`).
+	
+	:param source: A dictionary that represents a source (commit or file).
+	:param source_type: A string that represents the type of the source's collection ('commits' or 'files').
+	:returns: Two lists: the NumericIDs of the source if it is invalid (possibly more than once) and the
+	URLs of its invalid links, in the order they are detected.
+	"""
+
+	invalid_sources = []
+	invalid_links = []
 
-			# Check if conversation's prompt or answer contains non utf-8 characters
-			found = False # variable to exit nested loop
-			for conv in sharing['Conversations']:
-					if contains_invalid_chars(conv['Prompt']) or contains_invalid_chars(conv['Answer']):
-						# print("Non-utf in conv", source['URL']) # debugging
-						invalid_sources.append(source['NumericID'])
-						sharing_urls = [sharing['URL'] for sharing in source['ChatgptSharing']]
-						invalid_links.extend(sharing_urls)
-						found = True
-						break # exit nested loop
-			if found: # if non utf-8 found, no need to check the rest of the dialogues, so exit loop
+	# For different data types (commits, files), different text fields are checked.
+	if source_type == "commits":
+		# Check if entry's message contains non utf-8 characters
+		if contains_invalid_chars(source['Message']):
+				# print("Non-utf in commit message", source['URL']) # debugging
+				invalid_sources.append(source['NumericID'])
+				sharing_urls = [sharing['URL'] for sharing in source['ChatgptSharing']]
+				invalid_links.extend(sharing_urls)
+				return invalid_sources, invalid_links
+
+	elif source_type == "files":
+		# Check if entry's commit message contains non utf-8 characters
+		if contains_invalid_chars(source['CommitMessage']):
+				# print("Non-utf in commit message", source['URL']) # debugging
+				invalid_sources.append(source['NumericID'])
+				sharing_urls = [sharing['URL'] for sharing in source['ChatgptSharing']]
+				invalid_links.extend(sharing_urls)
+				return invalid_sources, invalid_links
+
+	source_contains_code = False # Variable to check if source contains code blocks
+
+	contains_active_link = False # Variable to store whether reference contains at least one active link
+
+	# Ckeck each Chatgpt shared link
+	for sharing in source['ChatgptSharing']:
+		# Check status code of the Chatgpt shared link, and keep only success (200)
+		if sharing['Status'] != 200:
+				invalid_links.append(sharing['URL'])
+				continue # continue to the next dialogue check
+		else:
+				contains_active_link = True
+
+		# For each conversation in the specific shared link, check if code block exists
+		link_contains_code = False
+		for conv in sharing['Conversations']:
+				if len(conv['ListOfCode']): # check if List of Code is not empty
+					link_contains_code = True # if code block found, no need to check the rest of the conversations, so exit loop
+					source_contains_code = True
 					break
 
-		# If there are no active links shared at the moment the snapshot was taken, remove source from data
-		if not contains_active_link:
-			# print("Bad status code", source['URL']) # debugging
-			invalid_sources.append(source['NumericID'])
+		# If no code blocks are detected in the link, add link to drop list
+		if not link_contains_code:
+			invalid_links.append(sharing['URL'])
+
+		# Check if any conversation's prompt or answer contains non utf-8 characters (all texts of the link at once)
+		texts = [text for conv in sharing['Conversations'] for text in (conv['Prompt'], conv['Answer'])]
+		if text_validator.any_invalid(texts):
+				# print("Non-utf in conv", source['URL']) # debugging
+				invalid_sources.append(source['NumericID'])
+				sharing_urls = [sharing['URL'] for sharing in source['ChatgptSharing']]
+				invalid_links.extend(sharing_urls)
+				break # if non utf-8 found, no need to check the rest of the dialogues, so exit loop
+
+	# If there are no active links shared at the moment the snapshot was taken, remove source from data
+	if not contains_active_link:
+		# print("Bad status code", source['URL']) # debugging
+		invalid_sources.append(source['NumericID'])
+
+	# If there are no code blocks in any of the shared links, remove source from data
+	if not source_contains_code:
+		# print("No-code source", source['URL']) # debugging
+		invalid_sources.append(source['NumericID'])
+
+	return invalid_sources, invalid_links
+
 
-		# If there are no code blocks in any of the shared links, remove source from data
-		if not source_contains_code:
-			# print("No-code source", source['URL']) # debugging
-			invalid_sources.append(source['NumericID'])
+def _check_sources_chunk(sources, source_type):
+	"""
+	Checks a chunk of sources in a worker process and returns the results of each source, in order.
+	"""
+
+	return [check_source(source, source_type) for source in sources]
+
+
+def detect_invalid_sources_parallel(data, workers=None, chunksize=64):
+	"""
+	Parallel version of `detect_invalid_sources`: the sources are split into chunks that are checked by a pool
+	of worker processes, and the results are merged in the order of the sources, so it returns exactly what 
+	the serial function returns for the same input.
+	
+	:param data: A list containing the collection of sources.
+	:param workers: An (optional) integer specifying the number of worker processes. Defaults to the number of CPUs.
+	:param chunksize: An (optional) integer specifying the number of sources sent to a worker at a time.
+	:returns: Two values: `invalid_sources` and `invalid_links` (see `detect_invalid_sources`).
+	"""
+
+	invalid_sources = []
+	invalid_links = []
+
+	# Retrieve the source type
+	source_type = data[0]['Type']
+
+	# Keep only the fields required for the checks, to reduce the data sent to the workers
+	message_fields = [field for field in ('Message', 'CommitMessage') if field in data[0]]
+	sources = [
+		{
+			'NumericID': source['NumericID'],
+			**{field: source[field] for field in message_fields},
+			'ChatgptSharing': [
+				{key: sharing[key] for key in ('URL', 'Status', 'Conversations') if key in sharing}
+				for sharing in source['ChatgptSharing']
+			]
+		}
+		for source in data
+	]
+	chunks = [sources[i:i + chunksize] for i in range(0, len(sources), chunksize)]
+
+	with ProcessPoolExecutor(max_workers=workers) as executor:
+		for chunk_results in executor.map(_check_sources_chunk, chunks, [source_type] * len(chunks)):
+			for source_invalid, source_invalid_links in chunk_results:
+				invalid_sources.extend(source_invalid)
+				invalid_links.extend(source_invalid_links)
 
 	return invalid_sources, invalid_links
 
@@ -168,6 +275,28 @@ def detect_duplicates(collection):
 	return duplicates, duplicate_links
 
 
+def detect_duplicate_links(links, duplicate_urls):
+	"""
+	This function finds the link entries to be removed because they refer to duplicate sources. Every URL is 
+	removed as many times as it appears in `duplicate_urls`, starting from its first occurrence in `links`.
+	
+	:param links: A list of dictionaries. Each dictionary represents a link entry (with its `_id` and `URL`).
+	:param duplicate_urls: A list of the URLs of the duplicate sources' links (a URL can appear more than once).
+	:returns: A list of the `_id`s of the link entries to be removed.
+	"""
+
+	# Number of entries to be removed for every URL
+	remaining = Counter(duplicate_urls)
+	duplicate_ids = []
+
+	for link in links:
+		if remaining[link['URL']] > 0:
+			duplicate_ids.append(link['_id'])
+			remaining[link['URL']] -= 1
+
+	return duplicate_ids
+
+
 def detect_dominant_language(dbobj):
 	"""
 	This function detects the most common programming language of the codes that were generated 
@@ -218,6 +347,97 @@ def detect_dominant_language(dbobj):
 	return programming_language
 
 
+def dominant_language_pipeline():
+	"""
+	Returns the aggregation pipeline that detects the dominant programming language of every document of a collection,
+	with the same rules as `detect_dominant_language`: the most common type of the generated code blocks, preferring
+	'python' or 'javascript' among the most common ones, and otherwise the one encountered first.
+	The output documents contain the `_id` of the source and its `DominantLanguage` 
+	(sources without any typed code block are not included).
+	"""
+
+	code = '$ChatgptSharing.Conversations.ListOfCode'
+	# Position of a code block within the document, used to find the language encountered first
+	position = {'$add': [
+		{'$multiply': ['$SharingIdx', 1000000000000]},
+		{'$multiply': ['$ConversationIdx', 1000000]},
+		'$CodeIdx'
+	]}
+	# Whether the language of the current element ($$this) ranks higher than the best one so far ($$value)
+	ranks_higher = {'$or': [
+		{'$eq': ['$$value', None]},
+		{'$gt': ['$$this.Count', '$$value.Count']},
+		{'$and': [
+			{'$eq': ['$$this.Count', '$$value.Count']},
+			{'$gt': ['$$this.Preferred', '$$value.Preferred']}
+		]},
+		{'$and': [
+			{'$eq': ['$$this.Count', '$$value.Count']},
+			{'$eq': ['$$this.Preferred', '$$value.Preferred']},
+			{'$lt': ['$$this.First', '$$value.First']}
+		]}
+	]}
+
+	return [
+		{'$project': {'ChatgptSharing.Conversations.ListOfCode.Type': True}},
+		{'$unwind': {'path': '$ChatgptSharing', 'includeArrayIndex': 'SharingIdx'}},
+		{'$match': {'ChatgptSharing.Conversations': {'$exists': True}}},
+		{'$unwind': {'path': '$ChatgptSharing.Conversations', 'includeArrayIndex': 'ConversationIdx'}},
+		{'$unwind': {'path': code, 'includeArrayIndex': 'CodeIdx'}},
+		{'$match': {'ChatgptSharing.Conversations.ListOfCode.Type': {'$ne': None}}},
+		# Count the code blocks of each language of each document, and find the position of its first block
+		{'$group': {
+			'_id': {'Source': '$_id', 'Language': f'{code}.Type'},
+			'Count': {'$sum': 1},
+			'First': {'$min': position}
+		}},
+		{'$group': {
+			'_id': '$_id.Source',
+			'Languages': {'$push': {
+				'Language': '$_id.Language',
+				'Count': '$Count',
+				'First': '$First',
+				'Preferred': {'$in': ['$_id.Language', ['python', 'javascript']]}
+			}}
+		}},
+		# Keep the language that ranks highest: most blocks, then preferred, then encountered first
+		{'$project': {'DominantLanguage': {'$reduce': {
+			'input': '$Languages',
+			'initialValue': None,
+			'in': {'$cond': [ranks_higher, '$$this', '$$value']}
+		}}}},
+		{'$project': {'DominantLanguage': '$DominantLanguage.Language'}}
+	]
+
+
+def detect_dominant_languages(dbmanager, collection_name):
+	"""
+	This function detects the dominant programming language of every document of a collection with a single aggregation,
+	and writes it to the `DominantLanguage` attribute of the documents with a single `$merge` (documents without any 
+	typed code block get 'Unknown', like in `detect_dominant_language`). MongoDB versions older than 4.2 do not support 
+	`$merge`, so a single unordered bulk write is used for them instead.
+	
+	:param dbmanager: The DBManager object of the database
+	:param collection_name: A string containing the name of the collection (commits or files)
+	"""
+
+	collection = dbmanager.db[collection_name]
+	collection.update_many({}, {'$set': {'DominantLanguage': 'Unknown'}})
+
+	pipeline = dominant_language_pipeline()
+	try:
+		collection.aggregate(pipeline + [
+			{'$merge': {'into': collection_name, 'on': '_id', 'whenMatched': 'merge', 'whenNotMatched': 'discard'}}
+		], allowDiskUse=True)
+	except OperationFailure:
+		operations = [
+			UpdateOne({'_id': result['_id']}, {'$set': {'DominantLanguage': result['DominantLanguage']}})
+			for result in collection.aggregate(pipeline, allowDiskUse=True)
+		]
+		if operations:
+			collection.bulk_write(operations, ordered=False)
+
+
 def handle_tisztamo(dbobj):
 	"""
 	This function checks extracts the JavaScript parts of the code blocks from dialogues of 
@@ -274,16 +494,24 @@ def handle_tisztamo(dbobj):
 def detect_file_language(filename):
 	"""
 	This function attempts to determine the language of a file based on its
-	filename using Pygments lexers.
+	filename using Pygments lexers (through the precomputed index of their filename patterns).
 	
 	:param filename: A string representing the name of the file.
 	:returns: The file name if the identification was successful, else it returns 'Unknown'.
 	"""
 
-	try:
-		# Attempt to find the lexer based on the file name
-		lexer = get_lexer_for_filename(filename)
-		return lexer.name
-	except ClassNotFound:
-		# If a lexer could not be found based on the file name
-		return 'Unknown'
+	# Attempt to find the lexer based on the file name
+	lexer = lexer_index.lookup(filename)
+	# If a lexer could not be found based on the file name
+	return lexer[0] if lexer else 'Unknown'
+
+
+def detect_file_languages(filenames):
+	"""
+	This function determines the language of several files (e.g. the files of a commit) at once.
+	
+	:param filenames: A list of strings representing the names of the files.
+	:returns: A list containing the language of each file ('Unknown' if the identification was not successful).
+	"""
+
+	return [lexer[0] if lexer else 'Unknown' for lexer in lexer_index.lookup_many(filenames)]
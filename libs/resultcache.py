@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from properties import resultcachepath, resultcachemaxmb
+
+
+class ResultCache:
+	"""
+	Class for maintaining a persistent cache of analysis results (PMD violations, code clone detections) in an
+	SQLite database. Each result is stored as JSON under a key computed from everything it depends on (the analyzed
+	content, the tool version, the ruleset, the parameters), so a re-run skips every unchanged snippet. When the total
+	size of the stored results exceeds `max_bytes`, the least recently used results are evicted.
+	Each process opens its own connection to the database, so the cache can be used by the analysis workers,
+	and the connection is shared by the threads of the process (guarded by a lock).
+	"""
+
+	def __init__(self, path, max_bytes=256 * 1024 * 1024):
+		self.path = path
+		self.max_bytes = max_bytes
+		self.counts = {'Hits': 0, 'Misses': 0, 'Stored': 0, 'Evicted': 0}
+		self.connection = None
+		self.pid = None
+		self.puts_since_check = 0
+		self.lock = threading.RLock()
+
+	def key(self, *parts):
+		"""
+		Returns the key of a result, i.e. the SHA-256 of the given parts (strings, numbers, lists of them).
+		"""
+		return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8', errors='surrogatepass')).hexdigest()
+
+	def get(self, key):
+		"""
+		Returns the stored result of the key, or None if it is not cached.
+		"""
+		with self.lock:
+			connection = self._connect()
+			row = connection.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+			if row is None:
+				self.counts['Misses'] += 1
+				return None
+
+			# Mark the result as recently used
+			with connection:
+				connection.execute('UPDATE results SET used = ? WHERE key = ?', (time.time(), key))
+			self.counts['Hits'] += 1
+		return json.loads(row[0])
+
+	def put(self, key, value):
+		"""
+		Stores a (JSON serializable) result, evicting old results if needed.
+		"""
+		data = json.dumps(value)
+		with self.lock:
+			connection = self._connect()
+			with connection:
+				connection.execute('INSERT OR REPLACE INTO results (key, value, size, used) VALUES (?, ?, ?, ?)',
+								   (key, data, len(data), time.time()))
+			self.counts['Stored'] += 1
+
+			# Check the size of the cache periodically, instead of after every insertion
+			self.puts_since_check += 1
+			if self.puts_since_check >= 100:
+				self.puts_since_check = 0
+				self.evict()
+
+	def evict(self):
+		"""
+		Deletes the least recently used results, if the cache exceeds its maximum size, until it is reduced to 90% of it.
+		"""
+		with self.lock:
+			connection = self._connect()
+			size = connection.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+			if size <= self.max_bytes:
+				return
+
+			evicted = []
+			for key, entry_size in connection.execute('SELECT key, size FROM results ORDER BY used'):
+				if size <= self.max_bytes * 0.9:
+					break
+				size -= entry_size
+				evicted.append((key,))
+
+			with connection:
+				connection.executemany('DELETE FROM results WHERE key = ?', evicted)
+			self.counts['Evicted'] += len(evicted)
+
+	def close(self):
+		with self.lock:
+			if self.connection is not None and self.pid == os.getpid():
+				self.connection.close()
+			self.connection = None
+
+	def _connect(self):
+		# Connections cannot be shared between processes, so a (forked) worker opens its own
+		if self.connection is None or self.pid != os.getpid():
+			directory = os.path.dirname(self.path)
+			if directory:
+				os.makedirs(directory, exist_ok=True)
+			connection = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+			connection.execute('PRAGMA journal_mode=WAL')
+			connection.execute('PRAGMA synchronous=NORMAL')
+			connection.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)')
+			connection.execute('CREATE INDEX IF NOT EXISTS results_used ON results (used)')
+			connection.commit()
+			self.connection = connection
+			self.pid = os.getpid()
+		return self.connection
+
+
+# Cache of the analysis results (used only if a path is configured in the environment)
+result_cache = None
+if resultcachepath:
+	result_cache = ResultCache(resultcachepath, int(resultcachemaxmb or 256) * 1024 * 1024)
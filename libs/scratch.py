@@ -0,0 +1,94 @@
+import os
+import atexit
+import shutil
+import threading
+import tempfile
+from properties import scratchdir
+
+# RAM-backed directory, preferred for the scratch files (if available)
+SHARED_MEMORY_DIR = '/dev/shm'
+
+
+def default_scratch_parent():
+	"""
+	Returns the directory where the scratch spaces are created: the SCRATCHDIR environment variable if set,
+	else a RAM-backed directory if available, else the default temporary directory of the system.
+	"""
+
+	if scratchdir:
+		return scratchdir
+	if os.path.isdir(SHARED_MEMORY_DIR) and os.access(SHARED_MEMORY_DIR, os.W_OK):
+		return SHARED_MEMORY_DIR
+	return None
+
+
+class ScratchSpace:
+	"""
+	Class for managing the temporary files given to the analysis tools (Simian, PMD). The files are written
+	in a private directory (created on first use), and are named 'slots': writing to a slot again overwrites its file,
+	so no files accumulate during a run. It can be used by several threads, as long as they write to different slots.
+	The directory is removed on `close` (or when leaving a `with` block, even on exceptions).
+	"""
+
+	def __init__(self, parent=None, prefix='scratch-'):
+		self.parent = parent
+		self.prefix = prefix
+		self.directory = None
+		self.bytes_written = 0
+		self.files_written = 0
+		self.lock = threading.Lock()
+
+	def path(self, slot):
+		"""
+		Returns the path of the file of a slot, creating the directory of the scratch space if needed.
+		"""
+
+		with self.lock:
+			if self.directory is None:
+				parent = self.parent or default_scratch_parent()
+				if parent:
+					os.makedirs(parent, exist_ok=True)
+				self.directory = tempfile.mkdtemp(prefix=self.prefix, dir=parent)
+			return os.path.join(self.directory, slot)
+
+	def write(self, slot, content, encoding='cp437', errors='ignore'):
+		"""
+		Writes the content to the file of a slot (overwriting its previous content).
+
+		:param slot: A string containing the file name of the slot, e.g. 'block.js'
+		:param content: A string containing the content to be written
+		:param encoding: The encoding of the file. The characters that cannot be encoded are ignored by default.
+		:returns: The path of the written file.
+		"""
+
+		path = self.path(slot)
+		data = content.encode(encoding, errors=errors)
+		with open(path, 'wb') as file:
+			file.write(data)
+		with self.lock:
+			self.bytes_written += len(data)
+			self.files_written += 1
+		return path
+
+	def close(self):
+		"""
+		Removes the directory of the scratch space and all its files.
+		"""
+
+		if self.directory is not None:
+			shutil.rmtree(self.directory, ignore_errors=True)
+			self.directory = None
+
+	def report(self):
+		return f"{self.files_written} scratch files written ({self.bytes_written / 1024:.1f} KB)"
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+
+# Scratch space of the process (its directory is created on first use and removed on exit)
+scratch_space = ScratchSpace()
+atexit.register(scratch_space.close)
@@ -1,5 +1,10 @@
 import os
-from pygments import lexers
+import json
+from libs.filetypes import lexer_index
+from libs.patch import parse_patch
+
+# Characters that can continue a JSON number
+NUMBER_CHARACTERS = frozenset('0123456789.eE+-')
 
 def get_subpath(snapshotpath, datatype):
 	"""
@@ -14,6 +19,97 @@ def get_subpath(snapshotpath, datatype):
 	return os.path.join(snapshotpath, datasubpath)
 
 
+def iter_json_array(infile, key, chunk_size=1 << 20):
+	"""
+	Incrementally parses a JSON file whose top-level object contains an array under `key`, and yields
+	the elements of that array one at a time. Only the element being decoded (plus one read chunk) is
+	kept in memory, so the file can be arbitrarily large.
+	
+	:param infile: A text file object opened for reading, positioned at the start of the JSON document.
+	:param key: A string that represents the name of the top-level attribute that holds the array (e.g. 'Sources').
+	:param chunk_size: An (optional) integer specifying how many characters are read from the file at a time.
+	:returns: A generator over the decoded elements of the array. If the key is not found, nothing is yielded.
+	"""
+
+	decoder = json.JSONDecoder()
+	buffer = infile.read(chunk_size)
+	pos = 0
+	eof = not buffer
+
+	def skip_whitespace():
+		# Advance the position to the next significant character, reading more data when needed
+		nonlocal buffer, pos, eof
+		while True:
+			while pos < len(buffer) and buffer[pos] in ' \t\n\r':
+				pos += 1
+			if pos < len(buffer) or eof:
+				return
+			buffer, pos = infile.read(chunk_size), 0
+			eof = not buffer
+
+	def decode_value():
+		# Decode the next JSON value, reading more data until the value is complete
+		nonlocal buffer, pos, eof
+		while True:
+			try:
+				value, end = decoder.raw_decode(buffer, pos)
+				# A value that ends exactly at the end of the buffer may be truncated (e.g. a number), and so may 
+				# a number followed by a character that continues it (e.g. '-25.' decoded as -25)
+				truncated = end == len(buffer) or (isinstance(value, (int, float)) and not isinstance(value, bool) 
+					and buffer[end] in NUMBER_CHARACTERS)
+				if not truncated or eof:
+					pos = end
+					return value
+			except json.JSONDecodeError:
+				if eof:
+					raise
+			# Drop the consumed part of the buffer and append the next chunk
+			chunk = infile.read(chunk_size)
+			eof = not chunk
+			buffer, pos = buffer[pos:] + chunk, 0
+
+	def expect(character):
+		# Consume the given structural character
+		nonlocal pos
+		skip_whitespace()
+		if pos >= len(buffer) or buffer[pos] != character:
+			raise ValueError(f"Expected '{character}' at position {pos} while parsing '{key}'")
+		pos += 1
+
+	expect('{')
+	skip_whitespace()
+	if buffer[pos:pos + 1] == '}':
+		return
+
+	# Walk the attributes of the top-level object, until the requested array is found
+	while True:
+		skip_whitespace()
+		attribute = decode_value()
+		expect(':')
+		skip_whitespace()
+
+		if attribute != key:
+			# Decode and discard the value of any other attribute
+			decode_value()
+		else:
+			expect('[')
+			skip_whitespace()
+			if buffer[pos:pos + 1] == ']':
+				return
+			while True:
+				skip_whitespace()
+				yield decode_value()
+				skip_whitespace()
+				if buffer[pos:pos + 1] == ']':
+					return
+				expect(',')
+
+		skip_whitespace()
+		if buffer[pos:pos + 1] == '}':
+			return
+		expect(',')
+
+
 def get_content_from_patch(patch, version):
 	"""
 	This functions extracts the code file's content from a patch file based on the specified file
@@ -26,33 +122,13 @@ def get_content_from_patch(patch, version):
 	:returns: the content of the file based on the given patch and version.
 	"""
 
-	patch_lines = patch.splitlines()
-	content_lines = []
-
-	if version == 'current':
-		# Specify which patch lines belongs to current version of the file
-		for line in patch_lines:
-			if line[0] == '+':
-				content_lines.append(line[1:])
-			elif line[0] != '@' and line[0] != '-':
-				content_lines.append(line)
-
-	elif version == 'previous':
-		# Specify which patch lines belongs to previous version of the file
-		for line in patch_lines:
-			if line[0] == '-':
-				content_lines.append(line[1:])
-			elif line[0] != '@' and line[0] != '+':
-				content_lines.append(line)
-
-	content = '\n'.join(content_lines)
-	return content
+	return parse_patch(patch).content(version)
 
 
 def get_file_extension(filename):
 	"""
 	This function attempts to determine the file extension of a given filename by
-	using the `get_lexer_for_filename` function from the `lexers` module.
+	finding its Pygments lexer (using the precomputed index of the lexers' filename patterns).
 	
 	:param filename: A string that represents the name of a file, including its extension
 	:returns: The file extension of the given filename if it can be determined by the `lexers` module. 
@@ -60,7 +136,7 @@ def get_file_extension(filename):
 	"""
 
 	try:
-		lexer = lexers.get_lexer_for_filename(filename)
-		return lexer.filenames[0]
+		lexer = lexer_index.lookup(filename)
+		return lexer[1] if lexer else None
 	except Exception as e:
 		return None
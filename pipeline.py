@@ -0,0 +1,64 @@
+import sys
+from properties import dbpath, datasetpath, snapshot, java, simian, pmd, sourcemeterjs
+from libs.dbmanager import DBManager
+from libs.pipeline import Stage, PipelineRunner, PYTHON
+
+""" Runs the whole pipeline (or the given stages), executing only the stages whose inputs changed since their last run.
+	Usage: python pipeline.py [--force] [--report] [stage ...]
+"""
+
+annotations = ['annotationscommits.txt', 'annotationsfiles.txt']
+results_collections = ['commits', 'files', 'links']
+snapshotpath = f"{datasetpath}/{snapshot}" if datasetpath and snapshot else None
+
+# Declare the stages, the stages they depend on, and their inputs
+stages = [
+	Stage('populate', [PYTHON, 'populatedb.py'],
+		files=['populatedb.py', 'properties.py', 'libs/dbmanager.py', 'libs/loading.py', 'libs/utils.py', 'libs/filetypes.py', 'libs/patch.py', snapshotpath]),
+	Stage('preprocess', [PYTHON, 'preprocessdata.py'], deps=['populate'],
+		files=['preprocessdata.py', 'properties.py', 'libs/dbmanager.py', 'libs/preprocessing.py', 'libs/filetypes.py', 'libs/download.py', 'libs/httpcache.py',
+			'scripts/createpreprocessingstatistics.py']),
+	Stage('analyze', [PYTHON, 'analyzedata.py'], deps=['preprocess'],
+		files=['analyzedata.py', 'properties.py', 'libs/dbmanager.py', 'libs/analysis.py', 'libs/codeanalysis.py', 'libs/codequality.py', 'libs/pmdreport.py', 'libs/patch.py',
+			'libs/resultcache.py', 'libs/scratch.py', 'libs/fingerprint.py', 'libs/utils.py', 'libs/filetypes.py', 'pmdrulesets'],
+		tools=[java, simian, pmd]),
+	Stage('annotdistribution', [PYTHON, 'createannotdistribution.py'], deps=['preprocess'],
+		files=['createannotdistribution.py', 'properties.py', 'libs/dbmanager.py'] + annotations, collections=results_collections),
+	Stage('langdistribution', [PYTHON, 'createlangdistribution.py'], deps=['preprocess'],
+		files=['createlangdistribution.py', 'properties.py', 'libs/dbmanager.py'], collections=results_collections),
+	Stage('rq1', [PYTHON, 'generateresults_rq1.py'], deps=['analyze'],
+		files=['generateresults_rq1.py', 'properties.py', 'libs/dbmanager.py'] + annotations, collections=results_collections),
+	Stage('rq2', [PYTHON, 'generateresults_rq2.py'], deps=['analyze'],
+		files=['generateresults_rq2.py', 'properties.py', 'libs/dbmanager.py'] + annotations, collections=results_collections),
+	Stage('rq3', [PYTHON, 'generateresults_rq3.py'], deps=['analyze'],
+		files=['generateresults_rq3.py', 'properties.py', 'libs/dbmanager.py'] + annotations, collections=results_collections),
+	Stage('sourcemeter_rq2', [PYTHON, 'generatesourcemeterresults_rq2.py'], deps=['analyze'],
+		files=['generatesourcemeterresults_rq2.py', 'scripts/executesourcemeter_rq2.py', 'properties.py', 'libs/dbmanager.py', 'libs/codequality.py',
+			'libs/pmdreport.py', 'libs/resultcache.py', 'libs/scratch.py', 'libs/fingerprint.py'] + annotations,
+		tools=[sourcemeterjs], collections=results_collections),
+	Stage('sourcemeter_rq3', [PYTHON, 'generatesourcemeterresults_rq3.py'], deps=['analyze'],
+		files=['generatesourcemeterresults_rq3.py', 'scripts/executesourcemeter_rq3.py', 'properties.py', 'libs/dbmanager.py', 'libs/codequality.py',
+			'libs/pmdreport.py', 'libs/resultcache.py', 'libs/scratch.py', 'libs/fingerprint.py', 'libs/patch.py'] + annotations,
+		tools=[sourcemeterjs], collections=results_collections),
+]
+
+if __name__ == "__main__":
+	args = sys.argv[1:]
+	force = '--force' in args
+	report = '--report' in args
+	targets = [arg for arg in args if not arg.startswith('--')]
+
+	# Connect to database (used to fingerprint the collections read by the stages)
+	dbmanager = DBManager(dbpath)
+	runner = PipelineRunner(stages, dbmanager=dbmanager)
+
+	if report:
+		runner.report()
+	else:
+		succeeded = runner.run(targets, force)
+		runner.report()
+		if not succeeded:
+			sys.exit(1)
+
+	# Close the DB connection
+	dbmanager.close()
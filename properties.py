@@ -13,4 +13,15 @@ java = os.getenv("JAVAPATH")
 simian = os.getenv("SIMIANPATH")
 sourcemeterjs = os.getenv("SOURCEMETERJSPATH")
 sourcemeterdir = os.getenv("SOURCEMETERDIR")
-resultspath = os.getenv("RESULTSPATH")
\ No newline at end of file
+resultspath = os.getenv("RESULTSPATH")
+loadworkers = os.getenv("LOADWORKERS")
+httpcachedir = os.getenv("HTTPCACHEDIR")
+httpcachemaxmb = os.getenv("HTTPCACHEMAXMB")
+offline = os.getenv("OFFLINE")
+preprocessworkers = os.getenv("PREPROCESSWORKERS")
+simianworker = os.getenv("SIMIANWORKER")
+analysisworkers = os.getenv("ANALYSISWORKERS")
+scratchdir = os.getenv("SCRATCHDIR")
+resultcachepath = os.getenv("RESULTCACHEPATH")
+resultcachemaxmb = os.getenv("RESULTCACHEMAXMB")
+pmdworkers = os.getenv("PMDWORKERS")
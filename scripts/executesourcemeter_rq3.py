@@ -3,7 +3,7 @@ import sys
 from properties import dbpath
 from libs.dbmanager import DBManager
 from libs.codequality import run_sourcemeter
-from libs.utils import get_content_from_patch
+from libs.patch import parse_patch
 
 """ Executes the SourceMeter tool for RQ3 
 	Executed by `gereratesourcemeterresults_rq3.py` (x2): one for each version of the files
@@ -47,9 +47,10 @@ for commit in db["commits"].find({'ChatgptSharing.AnalysisFeatures': {"$exists":
 				if language and language == 'JavaScript':
 					# Check if the specific file was cloned
 					if file['filename'] in files_with_clones:
-						content = get_content_from_patch(file['patch'], version)
+						parsed_patch = parse_patch(file['patch'])
+						content = parsed_patch.content(version)
 						# Check if previous patch exist and only then add it for calculation
-						prev_content = get_content_from_patch(file['patch'], 'previous')
+						prev_content = parsed_patch.content('previous')
 						if prev_content:
 							js_files.append(content)
 
@@ -94,12 +95,13 @@ for file in db["files"].find({'FileHistory': {"$exists": True}}):
 		continue
 
 	# Check if previous file version exists
-	prev_content = get_content_from_patch(file['FileHistory'].get('patch', ''), 'previous')
+	parsed_patch = parse_patch(file['FileHistory'].get('patch', ''))
+	prev_content = parsed_patch.content('previous')
 	if not prev_content:
 		continue
 
 	# Find the appropriate content and add it to the list
-	content = get_content_from_patch(file['FileHistory']['patch'], version)
+	content = parsed_patch.content(version)
 	js_files.append(content)
 							
 # Call function to run SourceMeter on the generated blocks
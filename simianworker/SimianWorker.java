@@ -0,0 +1,94 @@
+import java.io.BufferedReader;
+import java.io.ByteArrayOutputStream;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.nio.charset.StandardCharsets;
+import java.security.Permission;
+import java.util.jar.JarFile;
+
+/**
+ * Long-lived Simian worker, so that the JVM is started once instead of once per comparison.
+ *
+ * Usage: java -Djava.security.manager=allow -cp simian.jar SimianWorker.java simian.jar
+ *
+ * Reads one request per line from stdin, containing the (tab separated) command line arguments of Simian.
+ * For every request, it runs Simian's main class in the same JVM and writes Simian's output to stdout,
+ * followed by a line "@@SIMIAN-END@@ <exit code>". The exit code is trapped from Simian's System.exit call, so it is 0
+ * if Simian returns normally; the caller derives the result from the summary of the output instead.
+ */
+public class SimianWorker {
+
+    private static final String END_MARKER = "@@SIMIAN-END@@ ";
+
+    /** Thrown instead of exiting the JVM, when Simian calls System.exit. */
+    private static class ExitTrapped extends SecurityException {
+        final int status;
+
+        ExitTrapped(int status) {
+            super("System.exit(" + status + ")");
+            this.status = status;
+        }
+    }
+
+    public static void main(String[] args) throws Exception {
+        // Find Simian's main class from the jar's manifest
+        String mainClassName;
+        try (JarFile jar = new JarFile(args[0])) {
+            mainClassName = jar.getManifest().getMainAttributes().getValue("Main-Class");
+        }
+        Method simianMain = Class.forName(mainClassName).getMethod("main", String[].class);
+
+        // The responses are written to the real stdout, while Simian writes to a buffer that is reset per request
+        // (the same stream is kept, in case Simian holds a reference to System.out)
+        PrintStream responses = new PrintStream(new FileOutputStream(FileDescriptor.out), true, "UTF-8");
+        ByteArrayOutputStream buffer = new ByteArrayOutputStream();
+        PrintStream capture = new PrintStream(buffer, true, "UTF-8");
+        System.setOut(capture);
+        System.setErr(capture);
+
+        // Trap the System.exit calls of Simian, allowing everything else
+        System.setSecurityManager(new SecurityManager() {
+            @Override
+            public void checkExit(int status) {
+                throw new ExitTrapped(status);
+            }
+
+            @Override
+            public void checkPermission(Permission permission) {
+            }
+
+            @Override
+            public void checkPermission(Permission permission, Object context) {
+            }
+        });
+
+        BufferedReader requests = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        String request;
+        while ((request = requests.readLine()) != null) {
+            if (request.isEmpty()) {
+                continue;
+            }
+
+            buffer.reset();
+            int status = 0;
+            try {
+                simianMain.invoke(null, (Object) request.split("\t"));
+            } catch (InvocationTargetException e) {
+                Throwable cause = e.getCause();
+                while (cause != null && !(cause instanceof ExitTrapped)) {
+                    cause = cause.getCause();
+                }
+                status = cause != null ? ((ExitTrapped) cause).status : 2;
+            }
+
+            capture.flush();
+            responses.print(buffer.toString("UTF-8"));
+            responses.println();
+            responses.println(END_MARKER + status);
+        }
+    }
+}
@@ -0,0 +1,74 @@
+import os
+import sys
+import shutil
+import tempfile
+from libs.codeanalysis import run_simian, normalize_lines, find_clone_ranges, parse_simian_ranges, clone_details_from_ranges
+
+""" Checks that the native Python clone detection engine agrees with Simian, using Simian outputs recorded in 'test/simianoutputs'.
+Record them with '--record' (requires Java and Simian). A case without a recorded output fails, since the engines cannot be compared. """
+
+recordings_dir = r"./test/simianoutputs"
+
+# Test cases: (name, code file, code block, min_lines)
+cases = [
+	('js_threshold1', r"./test/file3.js", r"./test/file4.js", 1),
+	('js_threshold2', r"./test/file3.js", r"./test/file4.js", 2),
+	('js_threshold3', r"./test/file3.js", r"./test/file4.js", 3),
+	('lua_threshold1', r"./test/file1.lua", r"./test/file2.lua", 1),
+	('lua_threshold2', r"./test/file1.lua", r"./test/file2.lua", 2),
+]
+
+def read(path):
+	with open(path, 'r', encoding='cp437', errors='ignore') as file:
+		return file.read()
+
+record = '--record' in sys.argv
+failures = 0
+
+for name, file_path, block_path, min_lines in cases:
+	recording_path = os.path.join(recordings_dir, f"{name}.txt")
+	code_file = read(file_path)
+	extension = os.path.splitext(file_path)[1]
+
+	if record:
+		# Copy the inputs to the file names expected by the parser of Simian's output
+		temp_dir = tempfile.mkdtemp()
+		try:
+			file_code = os.path.join(temp_dir, f"file_code{extension}")
+			chat_code = os.path.join(temp_dir, f"chat_code{extension}")
+			shutil.copyfile(file_path, file_code)
+			shutil.copyfile(block_path, chat_code)
+			returncode, output = run_simian(['-defaultLanguage=text', f'-threshold={min_lines}', file_code, chat_code])
+		finally:
+			shutil.rmtree(temp_dir)
+		if returncode == 2:
+			print(f"{name}: error using Simian")
+			failures += 1
+			continue
+		os.makedirs(recordings_dir, exist_ok=True)
+		with open(recording_path, 'w', encoding='utf-8') as file:
+			file.write(output)
+		print(f"{name}: recorded")
+
+	if not os.path.exists(recording_path):
+		# Without a real Simian output there is nothing to compare against
+		print(f"{name}: FAILED, no recorded Simian output, run with '--record'")
+		failures += 1
+		continue
+
+	with open(recording_path, 'r', encoding='utf-8') as file:
+		simian_output = file.read()
+
+	expected = clone_details_from_ranges(code_file, parse_simian_ranges(simian_output))
+	ranges = find_clone_ranges(normalize_lines(code_file), normalize_lines(read(block_path)), min_lines)
+	actual = clone_details_from_ranges(code_file, ranges)
+
+	if actual == expected:
+		print(f"{name}: OK ({actual[1]} cloned lines)")
+	else:
+		print(f"{name}: MISMATCH, Simian found {expected[1]} cloned lines, the Python engine {actual[1]}")
+		print(f"Simian:\n{expected[0]}\nPython engine:\n{actual[0]}")
+		failures += 1
+
+print(f"{len(cases) - failures} passed, {failures} failed")
+assert failures == 0
@@ -0,0 +1,45 @@
+import random
+from properties import dbpath
+from libs.dbmanager import DBManager
+from libs.preprocessing import detect_dominant_language, detect_dominant_languages, dominant_language_pipeline
+
+""" Checks that the dominant languages detected with the collection-wide aggregation agree with `detect_dominant_language` (requires MongoDB) """
+
+dbmanager = DBManager(dbpath)
+
+# Generated documents, covering ties, missing types, sharings without conversations and dialogues without code blocks
+random.seed(0)
+languages = ['python', 'javascript', 'bash', 'java', 'c', None]
+documents = []
+for _ in range(2000):
+	sharings = []
+	for _ in range(random.randint(1, 3)):
+		if random.random() < 0.2:
+			sharings.append({'Status': 404})
+			continue
+		sharings.append({'Conversations': [
+			{'ListOfCode': [{'Type': random.choice(languages)} if random.random() < 0.9 else {} for _ in range(random.randint(0, 4))]}
+			for _ in range(random.randint(0, 3))
+		]})
+	documents.append({'ChatgptSharing': sharings})
+
+collection_name = 'dominantlanguagetest'
+dbmanager.db.drop_collection(collection_name)
+dbmanager.add_data(collection_name, documents)
+try:
+	detect_dominant_languages(dbmanager, collection_name)
+	mismatches = [
+		document['_id'] for document in dbmanager.get_all_documents(collection_name)
+		if document['DominantLanguage'] != detect_dominant_language(document)
+	]
+	assert not mismatches, f"{len(mismatches)} generated documents differ, e.g. {mismatches[:5]}"
+finally:
+	dbmanager.db.drop_collection(collection_name)
+
+# The collections of the dataset (read-only, if they have already been populated)
+for collection_name in ['commits', 'files']:
+	aggregated = {result['_id']: result['DominantLanguage'] for result in dbmanager.db[collection_name].aggregate(dominant_language_pipeline())}
+	for document in dbmanager.get_all_documents(collection_name):
+		assert aggregated.get(document['_id'], 'Unknown') == detect_dominant_language(document), f"{collection_name} {document['_id']} differs"
+
+print("Dominant language aggregation OK")
@@ -0,0 +1,88 @@
+import json
+import time
+import asyncio
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from libs.download import download_commits_content_async
+
+""" Checks the asynchronous GitHub downloader offline, against a local stand-in of the GitHub API """
+
+# Number of requests received for each URL
+requests_received = {}
+lock = threading.Lock()
+
+class StandInHandler(BaseHTTPRequestHandler):
+
+	def do_GET(self):
+		with lock:
+			requests_received[self.path] = requests_received.get(self.path, 0) + 1
+			count = requests_received[self.path]
+			total = sum(requests_received.values())
+
+		sha = self.path.rsplit('/', 1)[-1]
+
+		# Server error on the first request of 'flaky' commit
+		if sha == 'flaky' and count == 1:
+			self.send_response(502)
+			self.end_headers()
+			return
+
+		# Secondary rate limit on the first request of 'limited' commit
+		if sha == 'limited' and count == 1:
+			self.send_response(403)
+			self.send_header('Retry-After', '1')
+			self.end_headers()
+			self.wfile.write(b'{"message": "You have exceeded a secondary rate limit."}')
+			return
+
+		# Commit whose requests always fail
+		if sha == 'broken':
+			self.send_response(500)
+			self.send_header('Retry-After', '0')
+			self.end_headers()
+			return
+
+		# Not found commit
+		if sha == 'missing':
+			self.send_response(404)
+			self.end_headers()
+			self.wfile.write(b'{"message": "Not Found"}')
+			return
+
+		body = json.dumps({'sha': sha, 'files': [{'filename': f'{sha}.js'}]}).encode('utf-8')
+		self.send_response(200)
+		self.send_header('Content-Type', 'application/json')
+		# Low rate limit after a few requests, which resets in one second
+		self.send_header('X-RateLimit-Remaining', str(max(0, 20 - total)))
+		self.send_header('X-RateLimit-Reset', str(int(time.time()) + 1))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, format, *args):
+		pass
+
+server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+api_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+shas = [f"sha{i}" for i in range(20)] + ['flaky', 'limited', 'missing', 'broken']
+commits = [{'_id': i, 'RepoName': 'owner/repo', 'Sha': sha} for i, sha in enumerate(shas)]
+
+start = time.time()
+updates = asyncio.run(download_commits_content_async(commits, concurrency=4, api_url=api_url))
+print(f"Downloaded {len(updates)} of {len(commits)} commits in {time.time() - start:.1f}s")
+
+# Every commit except the broken one is resolved, in the order of the input, and the missing one has no content
+assert [update['_id'] for update in updates] == list(range(len(shas) - 1))
+assert all(update['ContentResolved'] for update in updates)
+assert all(update['CommitContent']['sha'] == shas[update['_id']] for update in updates if shas[update['_id']] != 'missing')
+assert 'CommitContent' not in updates[shas.index('missing')]
+# The failed requests were retried once, the missing commit was not retried
+assert requests_received['/repos/owner/repo/commits/flaky'] == 2
+assert requests_received['/repos/owner/repo/commits/limited'] == 2
+assert requests_received['/repos/owner/repo/commits/missing'] == 1
+# The broken commit was retried until giving up
+assert requests_received['/repos/owner/repo/commits/broken'] == 6
+
+server.shutdown()
+print("Downloader works correctly")
@@ -0,0 +1,170 @@
+import json
+import threading
+import requests
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from libs.download import resolve_file_history, download_files_history
+
+""" Checks offline, against a local stand-in of the GitHub API, that the file history resolver (one GraphQL query per file)
+finds the same commits as the per-commit REST resolver, that it falls back to the REST API when GraphQL is not available,
+and that the download marks the files without history and reports (and retries) the failed requests """
+
+# History of 'src/app.js' (most recent commit first) with the file's blob SHA in each commit (None if the file was deleted).
+# The last commit restores the blob of the second one, so the most recent of the two must be found.
+history = [('c5', 'b2'), ('c4', None), ('c3', 'b3'), ('c2', 'b2'), ('c1', 'b1')]
+file_path = 'src/app.js'
+
+# Repositories whose GraphQL query fails with an error response or is not available (404)
+graphql_errors = {'owner/errors'}
+graphql_missing = {'owner/missing'}
+# Repository whose most recent commit having a blob does not list the file (e.g. a merge commit)
+repo_merge = 'owner/merge'
+# Repository that no longer exists, repository whose first request fails, and repository that is always down
+repo_gone = 'owner/gone'
+repo_flaky = 'owner/flaky'
+repo_down = 'owner/down'
+
+# Number of requests received for each path
+requests_received = {}
+lock = threading.Lock()
+
+class StandInHandler(BaseHTTPRequestHandler):
+
+	def count(self, path):
+		with lock:
+			requests_received[path] = requests_received.get(path, 0) + 1
+
+	def send_json(self, body, status=200):
+		self.send_response(status)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('X-RateLimit-Remaining', '5000')
+		self.end_headers()
+		self.wfile.write(json.dumps(body).encode('utf-8'))
+
+	def send_server_error(self):
+		self.send_response(502)
+		self.send_header('Retry-After', '0')
+		self.end_headers()
+
+	def do_POST(self):
+		self.count('/graphql')
+		variables = json.loads(self.rfile.read(int(self.headers['Content-Length'])))['variables']
+		repo_name = f"{variables['owner']}/{variables['name']}"
+		self.count(f'/graphql/{repo_name}')
+
+		if repo_name == repo_down or (repo_name == repo_flaky and requests_received[f'/graphql/{repo_name}'] == 1):
+			self.send_server_error()
+		elif repo_name == repo_gone:
+			self.send_json({'data': {'repository': None}, 'errors': [{'type': 'NOT_FOUND'}]})
+		elif repo_name in graphql_errors:
+			self.send_json({'errors': [{'message': 'Something went wrong while executing your query.'}]})
+		elif repo_name in graphql_missing:
+			self.send_json({'message': 'Not Found'}, status=404)
+		else:
+			nodes = [{'oid': sha, 'file': {'oid': blob} if blob else None} for sha, blob in history[:variables['first']]]
+			self.send_json({'data': {'repository': {'defaultBranchRef': {'target': {'history': {'nodes': nodes}}}}}})
+
+	def do_GET(self):
+		url = urlparse(self.path)
+		self.count(url.path)
+		parts = url.path.strip('/').split('/')
+
+		if f"{parts[1]}/{parts[2]}" == repo_down:
+			self.send_server_error()
+			return
+		if f"{parts[1]}/{parts[2]}" == repo_gone:
+			self.send_json({'message': 'Not Found'}, status=404)
+			return
+
+		# List of the commits of the file's history
+		if parts[-1] == 'commits':
+			assert parse_qs(url.query)['path'] == [file_path]
+			self.send_json([{'sha': sha} for sha, _ in history])
+			return
+
+		# A commit, with the file's entry (if the file was not deleted) and another file
+		sha = parts[-1]
+		blob = dict(history)[sha]
+		files = [{'filename': 'README.md', 'sha': f'readme-{sha}', 'patch': ''}]
+		if blob and not (f"{parts[1]}/{parts[2]}" == repo_merge and sha == 'c5'):
+			files.append({'filename': file_path, 'sha': blob, 'patch': f'@@ patch of {sha} @@'})
+		self.send_json({'sha': sha, 'files': files})
+
+	def log_message(self, format, *args):
+		pass
+
+server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+api_url = f"http://127.0.0.1:{server.server_address[1]}"
+session = requests.Session()
+
+
+def resolve_with_rest(file):
+	# Per-commit REST resolver: downloads every commit of the file's history until the file's blob is found
+	repo_url = f"{api_url}/repos/{file['RepoName']}"
+	for commit in session.get(f"{repo_url}/commits", params={'path': file['FilePath']}).json():
+		for committed_file in session.get(f"{repo_url}/commits/{commit['sha']}").json()['files']:
+			if committed_file['sha'] == file['ObjectSha']:
+				return committed_file
+	return None
+
+
+failures = 0
+for repo_name in ('owner/graphql', 'owner/errors', 'owner/missing'):
+	for blob in ('b1', 'b2', 'b3', 'unknown'):
+		file = {'RepoName': repo_name, 'FilePath': file_path, 'ObjectSha': blob}
+		expected = resolve_with_rest(file)
+		requests_received.clear()
+		actual = resolve_file_history(session, file, {}, api_url=api_url)
+		commit_requests = sum(count for path, count in requests_received.items() if path.startswith(f'/repos/{repo_name}/commits/'))
+
+		if actual != expected:
+			print(f"{repo_name} {blob}: REST resolver found {expected}, resolver found {actual}")
+			failures += 1
+
+		# GraphQL finds the commit with one query and downloads only that commit
+		if repo_name == 'owner/graphql':
+			if requests_received.get('/graphql') != 1 or commit_requests != (1 if expected else 0):
+				print(f"{repo_name} {blob}: unexpected requests {requests_received}")
+				failures += 1
+		# Without GraphQL, the history is listed with the REST API
+		elif requests_received.get(f'/repos/{repo_name}/commits') != 1:
+			print(f"{repo_name} {blob}: the REST API was not used, requests {requests_received}")
+			failures += 1
+
+# The most recent commit having the blob is found
+assert resolve_file_history(session, {'RepoName': 'owner/graphql', 'FilePath': file_path, 'ObjectSha': 'b2'}, {}, api_url=api_url)['patch'] == '@@ patch of c5 @@'
+
+# If the most recent commit having the blob does not list the file, the older ones are searched (as the REST resolver does)
+file = {'RepoName': repo_merge, 'FilePath': file_path, 'ObjectSha': 'b2'}
+requests_received.clear()
+resolved = resolve_file_history(session, file, {}, api_url=api_url)
+assert requests_received['/repos/owner/merge/commits/c5'] == 1 and requests_received['/repos/owner/merge/commits/c2'] == 1
+assert resolved == resolve_with_rest(file) and resolved['patch'] == '@@ patch of c2 @@'
+
+# Commits downloaded for a file are reused for the other files of the repository
+commit_cache = {}
+requests_received.clear()
+for blob in ('b3', 'b3'):
+	resolve_file_history(session, {'RepoName': 'owner/graphql', 'FilePath': file_path, 'ObjectSha': blob}, commit_cache, api_url=api_url)
+assert requests_received['/repos/owner/graphql/commits/c3'] == 1
+
+# Download: the found and not found histories are marked as resolved, the failed file is reported and not marked
+files = [{'_id': i, 'RepoName': repo_name, 'FilePath': file_path, 'ObjectSha': blob} for i, (repo_name, blob) in 
+	enumerate([('owner/graphql', 'b3'), ('owner/graphql', 'unknown'), (repo_gone, 'b1'), (repo_flaky, 'b1'), (repo_down, 'b1')])]
+requests_received.clear()
+saved = []
+updates = download_files_history(files, on_result=saved.append, api_url=api_url)
+assert updates == saved
+assert [update['_id'] for update in updates] == [0, 1, 2, 3]
+assert all(update['HistoryResolved'] for update in updates)
+assert updates[0]['FileHistory']['patch'] == '@@ patch of c3 @@'
+assert 'FileHistory' not in updates[1] and 'FileHistory' not in updates[2]
+assert updates[3]['FileHistory']['patch'] == '@@ patch of c1 @@'
+# The server errors were retried (the flaky repository once, the repository that is down until giving up)
+assert requests_received['/graphql/owner/flaky'] == 2
+assert requests_received['/graphql/owner/down'] == 6 and requests_received['/repos/owner/down/commits'] == 6
+
+server.shutdown()
+print(f"File history resolution checked, {failures} failures")
+assert failures == 0
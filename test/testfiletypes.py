@@ -0,0 +1,37 @@
+import time
+from pygments.lexers import get_lexer_for_filename
+from pygments.lexers._mapping import LEXERS
+from pygments.util import ClassNotFound
+from libs.filetypes import lexer_index
+
+""" Checks that the lexer index identifies the same lexer as Pygments' `get_lexer_for_filename` """
+
+# File names built from the filename patterns of every lexer, and some usual or unusual names
+filenames = {'README', 'Makefile', 'CMakeLists.txt', '.bashrc', 'noext', 'a.b.c', 'x.tar.gz', 'a.JS', 'a.py.bak',
+			 'src/main.go', 'include/x.h', 'y.m', 'z.pl', 'q.inc', 't.ts', 'c.cls', 'page.html.twig', 'man.3', 'x.php5'}
+for _, _, _, patterns, _ in LEXERS.values():
+	for pattern in patterns:
+		for wildcard in ('', 'file'):
+			name = pattern.replace('*', wildcard).replace('[1-9]', '7').replace('[bp]', 'p').replace('[89]', '9')
+			filenames.add(name.replace('[345]', '3').replace('[gs]', 's'))
+
+mismatches = 0
+for filename in sorted(filenames):
+	try:
+		lexer = get_lexer_for_filename(filename)
+		expected = (lexer.name, lexer.filenames[0])
+	except ClassNotFound:
+		expected = None
+
+	if lexer_index.lookup(filename) != expected:
+		print(f"{filename}: Pygments {expected}, index {lexer_index.lookup(filename)}")
+		mismatches += 1
+
+print(f"{len(filenames)} file names checked, {mismatches} mismatches")
+assert mismatches == 0
+
+# Time the identification of the files of a large commit list
+names = [f"src/module{i}/file{i}.{extension}" for i in range(2000) for extension in ('js', 'py', 'java', 'md', 'json')]
+start = time.time()
+lexer_index.lookup_many(names)
+print(f"{len(names)} files identified in {time.time() - start:.3f} seconds")
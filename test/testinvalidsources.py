@@ -0,0 +1,59 @@
+import random
+from libs.preprocessing import detect_invalid_sources, detect_invalid_sources_parallel
+
+""" Checks that the parallel detection of the invalid sources returns exactly what the serial one returns """
+
+random.seed(0)
+
+# Texts with valid characters, and with characters that make a source invalid (e.g. CJK)
+valid_texts = ["plain text", "café → ∀x", "box │ and ★", "emoji \U0001F600"]
+invalid_texts = ["中文", "mixed é and ж"]
+
+def random_text():
+	return random.choice(invalid_texts) if random.random() < 0.05 else random.choice(valid_texts)
+
+def random_sharing(numeric_id, index):
+	url = f"https://chat.openai.com/share/{numeric_id}-{index}"
+	# Inactive links have no conversations
+	if random.random() < 0.2:
+		return {'URL': url, 'Status': 404}
+	return {'URL': url, 'Status': 200, 'Conversations': [
+		{'Prompt': random_text(), 'Answer': random_text(), 'ListOfCode': [{'Type': 'python'}] * random.randint(0, 2)}
+		for _ in range(random.randint(0, 3))
+	]}
+
+def random_sources(source_type, count):
+	message_field = 'Message' if source_type == 'commits' else 'CommitMessage'
+	return [
+		{
+			'Type': source_type,
+			'NumericID': numeric_id,
+			message_field: random_text(),
+			'ChatgptSharing': [random_sharing(numeric_id, index) for index in range(random.randint(1, 3))]
+		}
+		for numeric_id in range(1, count + 1)
+	]
+
+if __name__ == "__main__":
+	for source_type in ['commits', 'files']:
+		sources = random_sources(source_type, 500)
+		expected = detect_invalid_sources(sources)
+		assert expected[0] and expected[1], "The generated sources should contain invalid ones"
+
+		for workers in [1, 2, 4]:
+			for chunksize in [1, 7, 64, 1000]:
+				assert detect_invalid_sources_parallel(sources, workers, chunksize) == expected, f"{source_type}: differs with {workers} workers and chunks of {chunksize}"
+		print(f"{source_type}: OK ({len(set(expected[0]))} invalid sources, {len(expected[1])} invalid links)")
+
+	# An active link without conversations fails the same way in both modes
+	sources = random_sources('commits', 20)
+	sources[10]['ChatgptSharing'] = [{'URL': 'https://chat.openai.com/share/missing', 'Status': 200}]
+	for detect in [detect_invalid_sources, lambda data: detect_invalid_sources_parallel(data, 2, 4)]:
+		try:
+			detect(sources)
+		except KeyError as error:
+			assert error.args == ('Conversations',)
+		else:
+			raise AssertionError("A missing 'Conversations' should raise KeyError")
+
+	print("Parallel detection of invalid sources OK")
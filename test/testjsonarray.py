@@ -0,0 +1,27 @@
+import io
+import json
+from libs.utils import iter_json_array
+
+""" Checks that the incremental parsing of a JSON array gives the same elements as `json.load`, 
+even when the chunks split a value (e.g. a number right after its sign, '.' or exponent) """
+
+documents = [
+	'{"Sources": [-25000000000.0]}',
+	'{"Sources": [1, -2, 3.5, 1e10, -1.5E-3, 2e+2, 0, true, false, null]}',
+	'{"Other": {"a": [1.25, "x"]}, "Sources": [{"Value": -0.5, "Text": "a \\"b\\" c"}, "s", [1, 2.0]], "Last": 3}',
+	'{ "Sources" : [ 12 , 34.5e1 ] }',
+	'{"Sources": []}',
+	'{"Other": 1}',
+]
+
+failures = 0
+for document in documents:
+	expected = json.loads(document).get('Sources', [])
+	for chunk_size in (1, 2, 3, 5, 1 << 20):
+		actual = list(iter_json_array(io.StringIO(document), 'Sources', chunk_size=chunk_size))
+		if actual != expected:
+			print(f"{document} (chunk size {chunk_size}): expected {expected}, got {actual}")
+			failures += 1
+
+print(f"{len(documents)} documents checked, {failures} failures")
+assert failures == 0
@@ -0,0 +1,35 @@
+from libs.patch import parse_patch
+
+""" Checks the reconstruction of the file versions from a GitHub patch, and the mapping of their lines to the real file lines """
+
+patch = "\n".join([
+	"@@ -3,4 +3,5 @@ function start() {",
+	" const a = 1;",
+	"-const b = 2;",
+	"+const b = 3;",
+	"+const c = 4;",
+	"",
+	" return a + b;",
+	"@@ -20,2 +21,2 @@",
+	"-old();",
+	"+updated();",
+	" end();",
+	"\\ No newline at end of file",
+])
+
+parsed = parse_patch(patch)
+
+assert parsed.content('current') == "const a = 1;\nconst b = 3;\nconst c = 4;\n\nreturn a + b;\nupdated();\nend();"
+assert parsed.content('previous') == "const a = 1;\nconst b = 2;\n\nreturn a + b;\nold();\nend();"
+assert parsed.line_numbers['current'] == [3, 4, 5, 6, 7, 21, 22]
+assert parsed.line_numbers['previous'] == [3, 4, 5, 6, 20, 21]
+assert parsed.file_line('current', 6) == 21
+assert parsed.hunks == [(3, 4, 3, 5), (20, 2, 21, 2)]
+
+# Patches are memoized
+assert parse_patch(patch) is parsed
+
+# Empty patch
+assert parse_patch('').content('current') == ''
+
+print("Patch parsing OK")
@@ -0,0 +1,21 @@
+from pipeline import stages
+from libs.pipeline import python_imports
+
+""" Checks that the files of every stage of the pipeline include all the modules imported by its Python files,
+so that a change in any of them makes the stage out of date """
+
+failures = 0
+for stage in stages:
+	files = [path for path in stage.files if path]
+	missing = set()
+	for path in files:
+		if path.endswith('.py'):
+			missing |= python_imports(path) - set(files)
+
+	if missing:
+		print(f"{stage.name}: missing {', '.join(sorted(missing))}")
+		failures += 1
+	else:
+		print(f"{stage.name}: OK")
+
+assert failures == 0
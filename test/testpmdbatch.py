@@ -0,0 +1,76 @@
+import os
+import json
+import subprocess
+import libs.codequality as codequality
+from libs.pmdreport import Violation
+
+""" Checks that a code block PMD fails on does not discard the results of the rest of its batch (PMD is stubbed) """
+
+# The blocks PMD cannot parse are reported by the report of the single run
+pmd_runs = []
+
+def pmd_run_stub(command, **kwargs):
+	assert '--no-fail-on-error' in command
+	directory = command.split()[2]
+	pmd_runs.append(directory)
+	files, errors = [], []
+	for name in sorted(os.listdir(directory)):
+		path = os.path.join(directory, name)
+		with open(path) as file:
+			content = file.read()
+		if 'unparsable' in content:
+			errors.append({'filename': path, 'message': 'ParseException'})
+		else:
+			files.append({'filename': path, 'violations': [{'rule': 'Rule', 'ruleset': 'Best Practices', 'beginline': 1, 'priority': 3}]})
+	report = json.dumps({'files': files, 'processingErrors': errors})
+	return subprocess.CompletedProcess(command, 4, stdout=report, stderr='')
+
+run = codequality.subprocess.run
+codequality.subprocess.run = pmd_run_stub
+contents = [f"block {i}" for i in range(10)]
+contents[2] = contents[7] = 'unparsable block'
+violations = codequality.run_pmd_batch_isolating_errors(contents)
+codequality.subprocess.run = run
+assert len(pmd_runs) == 1
+assert violations[2] == -1 and violations[7] == -1
+assert all(len(violations[i]) == 1 for i in range(10) if i not in (2, 7))
+print("Unparsable blocks reported by a single PMD run")
+
+runs = []
+broken = False
+
+def run_pmd_batch_stub(contents, ruleset_path=codequality.JAVASCRIPT_RULESET, file_extension='.js'):
+	runs.append(len(contents))
+	# PMD fails for the whole batch if it contains a bad block (or always, if it is broken)
+	if broken or any('bad' in content for content in contents):
+		return -1
+	return [[Violation('file', 'Rule', 'Category', 1, 3, '')] * len(content) for content in contents]
+
+codequality.run_pmd_batch = run_pmd_batch_stub
+
+# A block that crashes PMD only fails itself
+contents = [f"block {i}" for i in range(10)]
+contents[3] = 'bad block'
+violations = codequality.run_pmd_batch_isolating_errors(contents)
+assert violations[3] == -1
+assert all(len(violations[i]) == len(contents[i]) for i in range(10) if i != 3)
+print(f"Bad block isolated with {len(runs)} PMD runs")
+
+# The results of the rest of the blocks are cached, and the bad block is reported as failed
+runs.clear()
+block_violations = {}
+assert codequality.prefetch_block_violations(contents, block_violations, batch_size=4) == -1
+assert all(block_violations[codequality.content_key(content)] != -1 for i, content in enumerate(contents) if i != 3)
+assert block_violations[codequality.content_key(contents[3])] == -1
+
+# The analyzed blocks (and the failed one) are not analyzed again
+runs.clear()
+assert codequality.prefetch_block_violations(contents[:5], block_violations) == 0 and not runs
+
+# If PMD does not work at all, the batch is not split
+runs.clear()
+broken = True
+assert codequality.run_pmd_batch_isolating_errors([f"other {i}" for i in range(100)]) == -1
+assert len(runs) == 2, runs
+
+print("PMD batch error isolation OK")
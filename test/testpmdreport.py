@@ -0,0 +1,68 @@
+from libs.pmdreport import parse_report, parse_json_report
+
+""" Checks the parsing of PMD's JSON and XML reports, using sample reports of PMD 7 """
+
+json_report = """{
+  "formatVersion": 0,
+  "pmdVersion": "7.0.0",
+  "timestamp": "2024-01-20T12:00:00.000+02:00",
+  "files": [
+    {
+      "filename": "/tmp/pmd-1/block_0.js",
+      "violations": [
+        {
+          "beginline": 3, "begincolumn": 1, "endline": 3, "endcolumn": 10,
+          "description": "Avoid using global variables (GlobalVariable)",
+          "rule": "GlobalVariable", "ruleset": "Best Practices", "priority": 3,
+          "externalInfoUrl": "https://docs.pmd-code.org/pmd-doc-7.0.0/pmd_rules_ecmascript_bestpractices.html#globalvariable"
+        },
+        {
+          "beginline": 7, "begincolumn": 5, "endline": 7, "endcolumn": 12,
+          "description": "Use '===' instead of '=='",
+          "rule": "EqualComparison", "ruleset": "Error Prone", "priority": 3,
+          "externalInfoUrl": ""
+        }
+      ]
+    }
+  ],
+  "suppressedViolations": [],
+  "processingErrors": [
+    {
+      "filename": "/tmp/pmd-1/block_1.js",
+      "message": "ParseException: Unexpected token: <",
+      "detail": "net.sourceforge.pmd.lang.ast.ParseException: Unexpected token: <"
+    }
+  ],
+  "configurationErrors": []
+}"""
+
+xml_report = """<?xml version="1.0" encoding="UTF-8"?>
+<pmd xmlns="http://pmd.sourceforge.net/report/2.0.0" version="7.0.0" timestamp="2024-01-20T12:00:00.000">
+<file name="/tmp/pmd-1/block_0.js">
+<violation beginline="3" endline="3" begincolumn="1" endcolumn="10" rule="GlobalVariable" ruleset="Best Practices" externalInfoUrl="" priority="3">
+Avoid using global variables (GlobalVariable)
+</violation>
+<violation beginline="7" endline="7" begincolumn="5" endcolumn="12" rule="EqualComparison" ruleset="Error Prone" externalInfoUrl="" priority="3">
+Use '===' instead of '=='
+</violation>
+</file>
+</pmd>"""
+
+for report_format, report in (('json', json_report), ('xml', xml_report)):
+	violations = parse_report(report, report_format)
+	print(report_format, violations)
+
+	# The rule name in the first description must not be counted twice
+	assert [violation.rule for violation in violations] == ['GlobalVariable', 'EqualComparison']
+	assert [violation.category for violation in violations] == ['BestPractices', 'ErrorProne']
+	assert [violation.line for violation in violations] == [3, 7]
+	assert all(violation.priority == 3 and violation.file.endswith('block_0.js') for violation in violations)
+
+# The files PMD failed to process are reported by the JSON report
+assert parse_json_report(json_report)[1] == ["/tmp/pmd-1/block_1.js"]
+
+# Empty output (e.g. no files analyzed)
+assert parse_report('', 'json') == [] and parse_report('', 'xml') == []
+assert parse_json_report('') == ([], [])
+
+print("PMD report parsing OK")
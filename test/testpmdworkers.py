@@ -0,0 +1,56 @@
+import time
+import random
+import threading
+import libs.codequality as codequality
+from libs.pmdreport import Violation
+
+""" Checks that the concurrent lint jobs of `before_after_violations_many` are reassembled in the order of the files,
+that a failed version marks only its own file, and that the jobs use a fixed set of scratch slots (PMD is stubbed) """
+
+used_slots = set()
+running_slots = set()
+lock = threading.Lock()
+
+def lint_file_stub(file_content, file_extension, slot='version'):
+	with lock:
+		assert slot not in running_slots, f"Slot {slot} used by two jobs at once"
+		running_slots.add(slot)
+		used_slots.add(slot)
+	# Finish the jobs in random order
+	time.sleep(random.random() / 100)
+	with lock:
+		running_slots.discard(slot)
+	if file_content == 'fail':
+		return -1
+	# One violation per line of the content
+	return [Violation('file', 'Rule', 'Category', line, 3, '') for line in range(1, file_content.count('\n') + 2)]
+
+codequality.lint_file = lint_file_stub
+
+files = [
+	{'Content': 'a', 'PrevContent': 'a\nb', 'Extension': '.js'},
+	{'Content': 'a\nb\nc', 'PrevContent': '', 'Extension': '.js'},
+	{'Content': 'fail', 'PrevContent': 'a', 'Extension': '.js'},
+	{'Content': 'a\nb', 'PrevContent': 'fail', 'Extension': '.js'},
+	{'Content': 'a\nb\nc\nd', 'PrevContent': 'a\nb\nc', 'Extension': '.js'},
+]
+
+for _ in range(3):
+	results = codequality.before_after_violations_many(files * 4, max_workers=3)
+
+	for i, result in enumerate(results):
+		file = files[i % len(files)]
+		if 'fail' in (file['Content'], file['PrevContent']):
+			assert result == -1, f"File {i} should have failed"
+			continue
+		assert result['Current'] == file['Content'].count('\n') + 1, f"File {i}: wrong current violations"
+		if file['PrevContent']:
+			assert result['Previous'] == file['PrevContent'].count('\n') + 1, f"File {i}: wrong previous violations"
+		else:
+			assert result['Previous'] == "No previous file version"
+		assert [detail['Line'] for detail in result['Details']['Current']] == list(range(1, result['Current'] + 1))
+
+# The scratch slots are reused across the calls (new threads do not create new files)
+assert used_slots == {'version_0', 'version_1', 'version_2'}, used_slots
+
+print("Concurrent before-after quality analysis OK")
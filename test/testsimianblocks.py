@@ -0,0 +1,61 @@
+import os
+import libs.codeanalysis as codeanalysis
+
+""" Checks that the code file is compared with all the code blocks of a sharing in a single Simian run, and that the clones
+are split by code block (Simian is stubbed: its output is built in Simian's format from the lines shared by the files) """
+
+simian_runs = []
+
+def run_simian_stub(args):
+	simian_runs.append(args)
+	paths = [arg for arg in args if not arg.startswith('-')]
+	contents = {}
+	for path in paths:
+		with open(path) as file:
+			contents[path] = file.read().splitlines()
+
+	# Report every line of the code file found in other files as a duplicate of one line
+	duplicates = []
+	for number, line in enumerate(contents[paths[0]], start=1):
+		others = [path for path in paths[1:] if line in contents[path]]
+		if line.strip() and others:
+			info = [f" Between lines {number} and {number} in {paths[0]}"]
+			info += [f" Between lines {contents[path].index(line) + 1} and {contents[path].index(line) + 1} in {path}" for path in others]
+			duplicates.append("Found 1 duplicate lines in the following files:\n" + "\n".join(info) + "\n")
+	output = "Simian stub\n" + "".join(duplicates) + f"Found {len(duplicates)} duplicate lines in {len(duplicates)} blocks in {len(paths)} files\n"
+	return (1 if duplicates else 0), output
+
+codeanalysis.run_simian = run_simian_stub
+
+code_file = "const a = 1;\nconst b = 2;\nconst c = 3;\nconst d = 4;\n"
+blocks = ["const a = 1;\nother();", "const b = 2;\nconst c = 3;", "nothing();", "unrelated();"]
+
+# The last block having cloned lines is chosen, with a single Simian run for all the blocks
+clone = codeanalysis.detect_code_clone(code_file, blocks, '.js', 1)
+assert len(simian_runs) == 1 and len(simian_runs[0]) == 3 + len(blocks), simian_runs
+assert [os.path.basename(path) for path in simian_runs[0][3:]] == [f"chat_code_{k}.js" for k in range(1, len(blocks) + 1)]
+assert clone['BlockIdx'] == 2 and clone['DuplicateLines'] == 2, clone
+assert clone['CloneDetails'] == "2: const b = 2;\n3: const c = 3;"
+
+# The clones of the code file are split by code block, ignoring the duplicates found only between code blocks
+output = "\n".join([
+	"Simian stub",
+	"Found 2 duplicate lines in the following files:",
+	" Between lines 1 and 2 in /scratch/chat_code_1.js",
+	" Between lines 3 and 4 in /scratch/chat_code_2.js",
+	"Found 2 duplicate lines in the following files:",
+	" Between lines 5 and 6 in /scratch/file_code.js",
+	" Between lines 1 and 2 in /scratch/chat_code_2.js",
+	" Between lines 7 and 8 in /scratch/chat_code_3.js",
+	"Found 4 duplicate lines in 2 blocks in 4 files",
+])
+assert codeanalysis.parse_simian_ranges_by_block(output, 3) == [[], [(5, 6)], [(5, 6)]]
+
+# No clones
+simian_runs.clear()
+assert codeanalysis.detect_code_clone(code_file, ["x();", "y();"], '.js', 1) == {} and len(simian_runs) == 1
+# No code blocks, no Simian run
+simian_runs.clear()
+assert codeanalysis.detect_code_clone(code_file, [], '.js', 1) == {} and not simian_runs
+
+print("Simian clone detection of all the code blocks at once OK")
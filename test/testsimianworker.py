@@ -0,0 +1,46 @@
+from libs.codeanalysis import run_simian, simian_status, simian_worker
+
+""" Checks that the long-lived Simian worker gives the same exit codes and output as running 'java -jar simian' """
+
+# Test cases: (code file, code block, threshold)
+cases = [
+	(r"./test/file3.js", r"./test/file4.js", 1),
+	(r"./test/file3.js", r"./test/file4.js", 3),
+	(r"./test/file1.lua", r"./test/file2.lua", 1),
+	(r"./test/file1.lua", r"./test/file2.lua", 2),
+]
+
+def significant_lines(output):
+	# The processing time differs between two runs
+	return [line for line in output.splitlines() if line.strip() and not line.startswith('Processing time')]
+
+failures = 0
+for file_path1, file_path2, threshold in cases:
+	args = ['-defaultLanguage=text', f'-threshold={threshold}', file_path1, file_path2]
+	jar_returncode, jar_output = run_simian(args, use_worker=False)
+	# Run the worker directly, so that it is not replaced by 'java -jar' if it is not available
+	worker_result = simian_worker.run(args)
+
+	if worker_result is None:
+		print(f"{file_path1} {file_path2} threshold {threshold}: FAILED, the Simian worker is not available")
+		failures += 1
+		continue
+	worker_returncode, worker_output = simian_status(*worker_result), worker_result[1]
+
+	if jar_returncode == 2:
+		print(f"{file_path1} {file_path2} threshold {threshold}: error using Simian")
+		failures += 1
+	elif (jar_returncode, significant_lines(jar_output)) != (worker_returncode, significant_lines(worker_output)):
+		print(f"{file_path1} {file_path2} threshold {threshold}: MISMATCH, java -jar exit code {jar_returncode}, worker exit code {worker_returncode}")
+		print(f"java -jar:\n{jar_output}\nworker:\n{worker_output}")
+		failures += 1
+	else:
+		print(f"{file_path1} {file_path2} threshold {threshold}: OK (exit code {jar_returncode})")
+
+# The exit code is derived from the summary of the output
+assert simian_status(0, "Found 4 duplicate lines in 2 blocks in 2 files") == 1
+assert simian_status(1, "Found 0 duplicate lines in 0 blocks in 0 files") == 0
+assert simian_status(0, "") == 2 and simian_status(2, "Found 0 duplicate lines in 0 blocks in 0 files") == 2
+
+print(f"{len(cases) - failures} passed, {failures} failed")
+assert failures == 0